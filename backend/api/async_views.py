@@ -0,0 +1,137 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import redirect
+from rest_framework import exceptions, status
+
+from backend.metrics import record_cache
+from recipes.cache import INGREDIENT_FIELDS, get_ingredient_catalogue
+from recipes.models import Ingredient, ShortLink
+
+from .mixins import anonymous_response_key, is_not_modified, set_cache_headers
+from .renderers import FastJSONRenderer
+from .views import RecipeViewSet
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+recipe_list_view = RecipeViewSet.as_view({'get': 'list', 'post': 'create'})
+recipe_detail_view = RecipeViewSet.as_view({
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+})
+
+
+@sync_to_async
+def _get_ingredients(search):
+    if not search.strip():
+        return get_ingredient_catalogue()
+    queryset = Ingredient.objects.all()
+    for term in search.replace(',', ' ').split():
+        queryset = queryset.filter(name__istartswith=term)
+    return list(queryset.values(*INGREDIENT_FIELDS))
+
+
+@sync_to_async
+def _get_ingredient(pk):
+    return Ingredient.objects.filter(pk=pk).values(*INGREDIENT_FIELDS).first()
+
+
+@sync_to_async
+def _get_short_link_recipe_id(key):
+    return ShortLink.objects.filter(key=key).values_list(
+        'recipe_id', flat=True).first()
+
+
+@sync_to_async(thread_sensitive=False)
+def _get_anonymous_entry(request, recipe_id):
+    return cache.get(anonymous_response_key(request, recipe_id))
+
+
+def _error_response(error):
+    # Ошибки в том же JSON, что отдают заменяемые представления DRF.
+    return JsonResponse(
+        {'detail': error.detail},
+        status=error.status_code,
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+def require_safe(view):
+    # require_safe из Django 3.2 не оборачивает async-представления.
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            response = _error_response(
+                exceptions.MethodNotAllowed(request.method))
+            response['Allow'] = ', '.join(SAFE_METHODS)
+            return response
+        return await view(request, *args, **kwargs)
+    return inner
+
+
+@require_safe
+async def ingredient_list(request):
+    return JsonResponse(
+        await _get_ingredients(request.GET.get('name', '')),
+        safe=False,
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+@require_safe
+async def ingredient_detail(request, pk):
+    ingredient = await _get_ingredient(pk)
+    if ingredient is None:
+        return _error_response(exceptions.NotFound())
+    return JsonResponse(
+        ingredient, json_dumps_params={'ensure_ascii': False})
+
+
+@require_safe
+async def short_link_redirect(request, key):
+    recipe_id = await _get_short_link_recipe_id(key)
+    if recipe_id is None:
+        return _error_response(exceptions.NotFound())
+    return redirect(f'/recipes/{recipe_id}/')
+
+
+def _accepts_cached_json(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and 'HTTP_AUTHORIZATION' not in request.META
+        and 'format' not in request.GET
+        and 'text/html' not in request.META.get('HTTP_ACCEPT', '')
+    )
+
+
+async def _recipe_response(request, view, recipe_id=None, **kwargs):
+    # Анонимный ответ из кэша отдаётся без перехода в поток с DRF.
+    if _accepts_cached_json(request):
+        entry = await _get_anonymous_entry(request, recipe_id)
+        if entry is not None:
+            record_cache('recipe_response', 1)
+            if is_not_modified(request, entry):
+                response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = HttpResponse(
+                    FastJSONRenderer().render(entry['data']),
+                    content_type='application/json',
+                )
+            return set_cache_headers(response, entry)
+    return await sync_to_async(view)(request, **kwargs)
+
+
+async def recipe_list(request):
+    return await _recipe_response(request, recipe_list_view)
+
+
+async def recipe_detail(request, pk):
+    return await _recipe_response(request, recipe_detail_view, pk, pk=pk)
+
+
+recipe_list.csrf_exempt = True
+recipe_detail.csrf_exempt = True
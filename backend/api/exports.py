@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from django.http import FileResponse, HttpResponse
+
+from backend.metrics import PDF_RENDER_TIME
+from backend.settings import (
+    EXPORTS_ACCEL_PREFIX,
+    EXPORTS_ROOT,
+    USE_X_ACCEL_REDIRECT
+)
+
+FONT_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'font/', 'Roboto.ttf'
+)
+FONT_NAME = 'Roboto'
+SHOPPING_CART_DIR = 'shopping_cart'
+
+
+def register_fonts():
+    # reportlab нужен только для PDF, поэтому импортируется лениво.
+    # Разбор TTF дорогой, шрифт регистрируется один раз на процесс.
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+def draw_shopping_cart(ingredients, output):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    register_fonts()
+
+    pdf = canvas.Canvas(output, pagesize=letter)
+    pdf.setFont(FONT_NAME, 14)
+    pdf.drawString(210, 820, 'Корзина покупок:')
+
+    y_position = 750
+    pdf.setFont(FONT_NAME, 12)
+
+    for item in ingredients:
+        name = item['ingredients__name']
+        unit = item['ingredients__measurement_unit']
+        amount = item['total_amount']
+        pdf.drawString(70, y_position, f'{name} ({unit}) — {amount}')
+        y_position -= 15
+
+    pdf.showPage()
+    pdf.save()
+
+
+def export_shopping_cart(ingredients):
+    # Одинаковый список покупок даёт одинаковый файл, поэтому готовый
+    # PDF переиспользуется, а запись идёт через временный файл.
+    ingredients = list(ingredients)
+    digest = hashlib.sha256(json.dumps(
+        ingredients, ensure_ascii=False, sort_keys=True, default=str
+    ).encode()).hexdigest()
+    name = os.path.join(SHOPPING_CART_DIR, f'{digest}.pdf')
+    path = os.path.join(EXPORTS_ROOT, name)
+    try:
+        # prune_exports удаляет файлы по времени изменения, поэтому
+        # отдаваемый PDF помечается свежим.
+        os.utime(path)
+        return name
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    output = tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(path), suffix='.tmp', delete=False)
+    try:
+        with output, PDF_RENDER_TIME.time():
+            draw_shopping_cart(ingredients, output)
+        os.replace(output.name, path)
+    except BaseException:
+        os.remove(output.name)
+        raise
+    return name
+
+
+def export_response(name, filename, content_type):
+    if USE_X_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = f'{EXPORTS_ACCEL_PREFIX}{name}'
+        response['Content-Disposition'] = (
+            f'attachment; filename="{filename}"')
+        return response
+    return FileResponse(
+        open(os.path.join(EXPORTS_ROOT, name), 'rb'),
+        as_attachment=True,
+        filename=filename,
+        content_type=content_type,
+    )
@@ -0,0 +1,126 @@
+import base64
+import binascii
+import tempfile
+
+from django.core.files.uploadedfile import UploadedFile
+from rest_framework import serializers
+
+from backend.metrics import IMAGE_UPLOAD_SIZE
+from backend.settings import (
+    ALLOWED_IMAGE_FORMATS,
+    IMAGE_SPOOL_MAX_MEMORY,
+    MAX_IMAGE_PIXELS,
+    MAX_IMAGE_SIZE
+)
+from recipes.images import get_rendition_names, renditions_ready
+
+DATA_URI_PREFIX = 'data:image/'
+DATA_URI_SEPARATOR = ';base64,'
+MAX_DATA_URI_HEADER_LENGTH = 64
+# Длина куска кратна 4, поэтому каждый кусок декодируется независимо.
+BASE64_CHUNK_SIZE = 64 * 1024
+IMAGE_EXTENSIONS = {'jpg': 'jpeg'}
+
+
+class Base64ImageField(serializers.ImageField):
+    default_error_messages = {
+        'invalid_image': 'Загрузите корректное изображение.',
+        'invalid_base64': 'Некорректные данные изображения в base64.',
+        'invalid_format': (
+            'Допустимые форматы изображений: '
+            f'{", ".join(ALLOWED_IMAGE_FORMATS)}.'
+        ),
+        'too_large': (
+            'Размер изображения не должен превышать '
+            f'{MAX_IMAGE_SIZE // (1024 * 1024)} МБ.'
+        ),
+        'too_many_pixels': 'Слишком большое разрешение изображения.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith(DATA_URI_PREFIX):
+            data = self._decode_data_uri(data)
+        file = serializers.FileField.to_internal_value(self, data)
+        if file.size > MAX_IMAGE_SIZE:
+            self.fail('too_large')
+        self._check_image(file)
+        IMAGE_UPLOAD_SIZE.labels(self.field_name).observe(file.size)
+        return file
+
+    def _decode_data_uri(self, data):
+        header, separator, _ = data[:MAX_DATA_URI_HEADER_LENGTH].partition(
+            DATA_URI_SEPARATOR)
+        if not separator:
+            self.fail('invalid_base64')
+        ext = header[len(DATA_URI_PREFIX):].lower()
+        ext = IMAGE_EXTENSIONS.get(ext, ext)
+        if ext not in ALLOWED_IMAGE_FORMATS:
+            self.fail('invalid_format')
+
+        start = len(header) + len(separator)
+        encoded_length = len(data) - start
+        padding = 2 if data.endswith('==') else int(data.endswith('='))
+        if encoded_length % 4:
+            self.fail('invalid_base64')
+        if encoded_length // 4 * 3 - padding > MAX_IMAGE_SIZE:
+            self.fail('too_large')
+
+        spool = tempfile.SpooledTemporaryFile(max_size=IMAGE_SPOOL_MAX_MEMORY)
+        size = 0
+        try:
+            for offset in range(start, len(data), BASE64_CHUNK_SIZE):
+                chunk = base64.b64decode(
+                    data[offset:offset + BASE64_CHUNK_SIZE], validate=True)
+                size += len(chunk)
+                if size > MAX_IMAGE_SIZE:
+                    self.fail('too_large')
+                spool.write(chunk)
+        except binascii.Error:
+            spool.close()
+            self.fail('invalid_base64')
+        except serializers.ValidationError:
+            spool.close()
+            raise
+        spool.seek(0)
+        return UploadedFile(
+            spool,
+            name=f'image.{ext}',
+            content_type=f'image/{ext}',
+            size=size,
+        )
+
+    def _check_image(self, file):
+        # Pillow читает только заголовок, пиксели не декодируются.
+        from PIL import Image
+
+        file.seek(0)
+        try:
+            with Image.open(file) as image:
+                image_format = image.format
+                width, height = image.size
+        except (OSError, Image.DecompressionBombError):
+            self.fail('invalid_image')
+        finally:
+            file.seek(0)
+        if (image_format or '').lower() not in ALLOWED_IMAGE_FORMATS:
+            self.fail('invalid_format')
+        if width * height > MAX_IMAGE_PIXELS:
+            self.fail('too_many_pixels')
+
+
+class ImageRenditionsField(serializers.ReadOnlyField):
+    def to_representation(self, value):
+        if not renditions_ready(value):
+            return None
+        return self.get_urls(value.storage, value.name)
+
+    def get_urls(self, storage, name):
+        request = self.context.get('request')
+        urls = {}
+        for rendition, formats in get_rendition_names(name).items():
+            urls[rendition] = {}
+            for image_format, rendition_name in formats.items():
+                url = storage.url(rendition_name)
+                urls[rendition][image_format] = (
+                    request.build_absolute_uri(url) if request else url)
+        return urls
@@ -1,8 +1,17 @@
+from django import forms
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Count, F
 from django_filters import rest_framework as filters
 from django_filters.rest_framework import FilterSet
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Recipe
+from backend.settings import SEARCH_CONFIG
+from recipes.models import Recipe, RecipeIngredient
+
+
+class IntegerInFilter(filters.BaseInFilter, filters.NumberFilter):
+    # NumberFilter разбирает Decimal, и id вида 1.9 превращались бы в 1.
+    field_class = forms.IntegerField
 
 
 class IngredientsSearchFilter(SearchFilter):
@@ -18,10 +27,21 @@ class RecipeFilterSet(FilterSet):
     is_favorited = filters.BooleanFilter(method="filter_is_favorited")
     is_in_shopping_cart = filters.BooleanFilter(
         method="filter_is_in_shopping_cart")
+    search = filters.CharFilter(method="filter_search")
+    ingredients = IntegerInFilter(method="filter_ingredients")
+    exclude_ingredients = IntegerInFilter(method="filter_exclude_ingredients")
+    min_cooking_time = filters.NumberFilter(
+        field_name="cooking_time", lookup_expr="gte")
+    max_cooking_time = filters.NumberFilter(
+        field_name="cooking_time", lookup_expr="lte")
 
     class Meta:
         model = Recipe
-        fields = ("author", "is_favorited", "is_in_shopping_cart")
+        fields = (
+            "author", "is_favorited", "is_in_shopping_cart", "search",
+            "ingredients", "exclude_ingredients",
+            "min_cooking_time", "max_cooking_time",
+        )
 
     def _filter_by_user_relation(self, queryset, relation_field, value):
         if value and self.request.user.is_authenticated:
@@ -34,3 +54,43 @@ class RecipeFilterSet(FilterSet):
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         return self._filter_by_user_relation(queryset, "shopping_cart", value)
+
+    def filter_search(self, queryset, name, value):
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type="websearch")
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F("search_vector"), query)
+        ).order_by("-rank", "-id")
+
+    def filter_ingredients(self, queryset, name, value):
+        ingredient_ids = set(value)
+        if not ingredient_ids:
+            return queryset
+        recipes_with_all = (
+            RecipeIngredient.objects.filter(ingredients__in=ingredient_ids)
+            .order_by()
+            .values("recipe")
+            .annotate(matched=Count("ingredients"))
+            .filter(matched=len(ingredient_ids))
+            .values("recipe")
+        )
+        return queryset.filter(pk__in=recipes_with_all)
+
+    def filter_exclude_ingredients(self, queryset, name, value):
+        ingredient_ids = set(value)
+        if not ingredient_ids:
+            return queryset
+        return queryset.exclude(pk__in=RecipeIngredient.objects.filter(
+            ingredients__in=ingredient_ids).values("recipe"))
+
+
+class RecipeByIngredientsFilterSet(RecipeFilterSet):
+    # В поиске по ингредиентам ingredients означает «хотя бы один из» и
+    # разбирается самим обработчиком.
+    ingredients = None
+
+    class Meta(RecipeFilterSet.Meta):
+        fields = tuple(
+            name for name in RecipeFilterSet.Meta.fields
+            if name != "ingredients"
+        )
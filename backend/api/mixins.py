@@ -0,0 +1,145 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from django.utils.http import (
+    http_date,
+    parse_etags,
+    parse_http_date_safe,
+    quote_etag
+)
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from backend.metrics import record_cache
+from backend.settings import RECIPE_RESPONSE_CACHE_TIMEOUT
+from recipes.cache import get_recipe_list_version, get_recipe_version
+
+from .renderers import FastJSONRenderer
+
+
+def anonymous_response_key(request, recipe_id=None):
+    if recipe_id is None:
+        prefix = f'list:{get_recipe_list_version()}'
+    else:
+        prefix = f'detail:{recipe_id}:{get_recipe_version(recipe_id)}'
+    query = urlencode(sorted(
+        (key, value)
+        for key, values in request.GET.lists()
+        for value in values
+    ))
+    # Ссылки пагинации абсолютные, поэтому хост входит в ключ.
+    digest = hashlib.md5(
+        f'{request.build_absolute_uri(request.path)}?{query}'.encode()
+    ).hexdigest()
+    return f'recipes:response:{prefix}:{digest}'
+
+
+def is_not_modified(request, entry):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        # GZipMiddleware ослабляет ETag, поэтому сравнение слабое.
+        etags = {
+            etag.removeprefix('W/') for etag in parse_etags(if_none_match)}
+        return '*' in etags or entry['etag'] in etags
+    if_modified_since = parse_http_date_safe(
+        request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return (if_modified_since is not None
+            and entry['last_modified'] <= if_modified_since)
+
+
+def set_cache_headers(response, entry):
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    response['Cache-Control'] = 'no-cache'
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+class AnonymousRecipeCacheMixin:
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(
+            request, None, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return self._cached_response(
+            request, pk, super().retrieve, *args, **kwargs)
+
+    def _cached_response(self, request, recipe_id, handler, *args,
+                         **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        key = anonymous_response_key(request, recipe_id)
+        entry = cache.get(key)
+        record_cache('recipe_response', entry is not None, entry is None)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = {
+                'data': response.data,
+                'etag': quote_etag(hashlib.md5(
+                    FastJSONRenderer().render(response.data)).hexdigest()),
+                'last_modified': int(time.time()),
+            }
+            cache.set(key, entry, RECIPE_RESPONSE_CACHE_TIMEOUT)
+
+        if is_not_modified(request, entry):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(entry['data'])
+        return set_cache_headers(response, entry)
+
+
+class SparseFieldsetMixin:
+    sparse_actions = ('list', 'retrieve')
+
+    def get_sparse_fields(self):
+        # ?fields= оставляет в ответе только перечисленные поля,
+        # ?expand= разворачивает вложенные объекты вместо их id.
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = self._parse_sparse_fields()
+        return self._sparse_fields
+
+    def _parse_sparse_fields(self):
+        if (self.action not in self.sparse_actions
+                or self.request.method != 'GET'):
+            return None, frozenset()
+        fields, expand = (
+            frozenset(filter(None, (
+                name.strip()
+                for name in self.request.query_params.get(param, '').split(',')
+            )))
+            for param in ('fields', 'expand')
+        )
+        if not fields:
+            return None, frozenset()
+
+        serializer_class = self.get_serializer_class()
+        readable = {
+            name for name, field in serializer_class().fields.items()
+            if not field.write_only
+        }
+        if unknown := (fields | expand) - readable:
+            raise ValidationError(
+                {'fields': f'Неизвестные поля: {", ".join(sorted(unknown))}.'})
+        expandable = getattr(serializer_class.Meta, 'expandable_fields', ())
+        if not_expandable := expand - set(expandable):
+            raise ValidationError({'expand': (
+                'Нельзя развернуть поля: '
+                f'{", ".join(sorted(not_expandable))}.'
+            )})
+        return fields | expand, expand
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        fields, expand = self.get_sparse_fields()
+        if fields is not None:
+            context.update(fields=fields, expand=expand)
+        return context
@@ -0,0 +1,28 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    if orjson else 0
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    # Компактный JSON через orjson. С отступами, с экранированием ASCII
+    # или без orjson работает обычный рендерер DRF.
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or self.ensure_ascii or self.get_indent(
+                accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        # Даты и прочие типы кодируются так же, как в DRF.
+        ret = orjson.dumps(
+            data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029')
@@ -1,9 +1,12 @@
-import base64
+import hashlib
+import json
 
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
-from django.db import transaction
+from django.db import models, transaction
+from django.db.models import prefetch_related_objects
+from django.db.models.fields.files import ImageFieldFile
 from rest_framework import serializers
+from rest_framework.utils import html
 from rest_framework.validators import UniqueTogetherValidator
 
 from backend.settings import (
@@ -13,6 +16,7 @@ from backend.settings import (
     MIN_INGREDIENTS_COUNT,
     REGEX_USERNAME
 )
+from recipes.cache import get_recipe_fragments, set_recipe_fragments
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -22,14 +26,69 @@ from recipes.models import (
 )
 from users.models import User
 
-
-class Base64ImageField(serializers.ImageField):
-    def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name=f'image.{ext}')
-        return super().to_internal_value(data)
+from .fields import Base64ImageField, ImageRenditionsField
+
+# Колонки, из которых поля рецепта собираются без создания моделей.
+RECIPE_VALUE_COLUMNS = {
+    'id': 'id',
+    'author': 'author',
+    'name': 'name',
+    'image': 'image',
+    'image_renditions': 'rendered_image',
+    'text': 'text',
+    'cooking_time': 'cooking_time',
+    'is_favorited': 'is_favorited_by_me',
+    'is_in_shopping_cart': 'is_in_my_shopping_cart',
+}
+RECIPE_VIEWER_FLAGS = ('is_favorited', 'is_in_shopping_cart')
+USER_VALUE_COLUMNS = {
+    'id': 'id',
+    'email': 'email',
+    'username': 'username',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'avatar': 'avatar',
+    'avatar_renditions': 'rendered_avatar',
+}
+# Копии отдаются, только если созданы для текущего файла картинки.
+RENDERED_IMAGE_COLUMNS = {
+    'rendered_image': 'image',
+    'rendered_avatar': 'avatar',
+}
+
+
+def get_value_columns(value_columns, fields):
+    columns = {value_columns[name] for name in fields if name in value_columns}
+    return columns | {
+        RENDERED_IMAGE_COLUMNS[column] for column in columns
+        if column in RENDERED_IMAGE_COLUMNS
+    }
+
+
+class SparseFieldsMixin:
+    compact_fields = frozenset()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields is None:
+            return
+        expand = self.context.get('expand', frozenset())
+        for name in set(self.fields) - fields:
+            self.fields.pop(name)
+        # Поля из Meta.expandable_fields без ?expand= отдаются
+        # идентификаторами.
+        self.compact_fields = frozenset(
+            name for name in getattr(self.Meta, 'expandable_fields', ())
+            if name in self.fields and name not in expand
+        )
+        for name in self.compact_fields:
+            field = self.fields[name]
+            self.fields[name] = serializers.PrimaryKeyRelatedField(
+                read_only=True,
+                many=isinstance(field, serializers.ListSerializer),
+                source=None if field.source == name else field.source,
+            )
 
 
 class IngredientsSerializer(serializers.ModelSerializer):
@@ -67,9 +126,11 @@ class RecipeIngridientsSerializer(serializers.ModelSerializer):
 
 
 class RecipeShortInfoSerializer(serializers.ModelSerializer):
+    image_renditions = ImageRenditionsField(source='image')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -98,7 +159,7 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         ]
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     email = serializers.EmailField(required=True)
     username = serializers.RegexField(
         regex=REGEX_USERNAME, required=True
@@ -108,12 +169,13 @@ class UserSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     password = serializers.CharField(write_only=True, required=True)
     avatar = Base64ImageField()
+    avatar_renditions = ImageRenditionsField(source='avatar')
 
     class Meta:
         model = User
         fields = (
             'email', 'id', 'username', 'first_name', 'last_name',
-            'is_subscribed', 'password', 'avatar',
+            'is_subscribed', 'password', 'avatar', 'avatar_renditions',
         )
 
     def get_is_subscribed(self, obj):
@@ -122,6 +184,15 @@ class UserSerializer(serializers.ModelSerializer):
                 and user.subscriber.filter(author=obj).exists())
 
 
+class AuthorFragmentSerializer(UserSerializer):
+    is_subscribed = None
+    password = None
+
+    class Meta(UserSerializer.Meta):
+        fields = ('email', 'id', 'username', 'first_name', 'last_name',
+                  'avatar', 'avatar_renditions')
+
+
 class UserAvatarSerializer(serializers.ModelSerializer):
     avatar = Base64ImageField(required=True)
 
@@ -136,18 +207,22 @@ class UserAvatarSerializer(serializers.ModelSerializer):
         return instance
 
 
-class UserSubscriptionsSerializer(serializers.ModelSerializer):
+class UserSubscriptionsSerializer(SparseFieldsMixin,
+                                  serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     recipes = RecipeShortInfoSerializer(many=True, read_only=True)
     recipes_count = serializers.SerializerMethodField()
     avatar = Base64ImageField()
+    avatar_renditions = ImageRenditionsField(source='avatar')
 
     class Meta:
         model = User
         fields = (
             'id', 'username', 'email', 'first_name', 'last_name',
             'is_subscribed', 'recipes', 'recipes_count', 'avatar',
+            'avatar_renditions',
         )
+        expandable_fields = ('recipes',)
 
     def get_is_subscribed(self, obj):
         user = self.context['request'].user
@@ -155,10 +230,15 @@ class UserSubscriptionsSerializer(serializers.ModelSerializer):
                 and user.subscriber.filter(author=obj).exists())
 
     def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        count = getattr(obj, 'recipes_total', None)
+        if count is None:
+            return obj.recipes.count()
+        return count
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
+        if 'recipes' not in data:
+            return data
         if recipes_limit := self.context['request'].query_params.get(
                 'recipes_limit'):
             try:
@@ -172,31 +252,159 @@ class UserSubscriptionsSerializer(serializers.ModelSerializer):
         return data
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeFragmentSerializer(serializers.ModelSerializer):
+    author = AuthorFragmentSerializer(read_only=True)
+    ingredients = RecipeIngridientsSerializer(
+        many=True, read_only=True, source='recipes_ingredient'
+    )
+
+    image_renditions = ImageRenditionsField(source='image')
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'id', 'author', 'ingredients', 'name', 'image',
+            'image_renditions', 'text', 'cooking_time',
+        )
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, models.Manager) else data
+        return self.child.to_representation_many(list(recipes))
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     ingredients = RecipeIngridientsSerializer(
         many=True, read_only=True, source='recipes_ingredient'
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_renditions = ImageRenditionsField(source='image')
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time',
+            'is_in_shopping_cart', 'name', 'image', 'image_renditions',
+            'text', 'cooking_time',
         )
+        list_serializer_class = RecipeListSerializer
+        expandable_fields = ('author',)
+
+    def to_representation(self, instance):
+        return self.to_representation_many([instance])[0]
+
+    def to_representation_many(self, recipes):
+        if recipes and isinstance(recipes[0], dict):
+            return [self._represent_values(row) for row in recipes]
+        if 'ingredients' not in self.fields and (
+                'author' not in self.fields
+                or 'author' in self.compact_fields):
+            return [super().to_representation(recipe) for recipe in recipes]
+        # Независимая от пользователя часть рецепта берётся из кэша,
+        # поверх неё считаются только флаги текущего пользователя.
+        request = self.context['request']
+        prefix = hashlib.md5(
+            request.build_absolute_uri('/').encode()).hexdigest()[:8]
+        fragments, versions = get_recipe_fragments(
+            prefix, [recipe.pk for recipe in recipes])
+        missing = [recipe for recipe in recipes if recipe.pk not in fragments]
+        if any(recipe.get_deferred_fields() for recipe in missing):
+            # С ?fields= часть столбцов отложена, и фрагмент по таким
+            # объектам стоил бы запроса на каждое поле каждого рецепта.
+            missing = list(Recipe.objects.select_related('author').in_bulk(
+                [recipe.pk for recipe in missing]).values())
+        if missing:
+            prefetch_related_objects(
+                missing, 'author', 'recipes_ingredient__ingredients')
+            built = {
+                recipe.pk: RecipeFragmentSerializer(
+                    recipe, context=self.context).data
+                for recipe in missing
+            }
+            set_recipe_fragments(prefix, built, versions)
+            fragments.update(built)
+        return [
+            self._merge_fragment(recipe, fragments[recipe.pk])
+            for recipe in recipes
+        ]
 
-    def _check_user_relation(self, obj, model):
+    def _merge_fragment(self, recipe, fragment):
+        data = {
+            name: value for name, value in fragment.items()
+            if name not in self.compact_fields
+        }
+        if 'author' in self.fields and 'author' in data:
+            author = dict(fragment['author'])
+            author['is_subscribed'] = self._is_author_subscribed(recipe)
+            data['author'] = {
+                name: author[name]
+                for name in UserSerializer.Meta.fields if name in author
+            }
+        representation = {}
+        for field in self._readable_fields:
+            if field.field_name in data:
+                representation[field.field_name] = data[field.field_name]
+            else:
+                representation[field.field_name] = field.to_representation(
+                    field.get_attribute(recipe))
+        return representation
+
+    def _represent_values(self, row):
+        image_field = Recipe._meta.get_field('image')
+        representation = {}
+        for field in self._readable_fields:
+            column = RECIPE_VALUE_COLUMNS[field.field_name]
+            value = row.get(column)
+            if field.field_name in RECIPE_VIEWER_FLAGS:
+                value = bool(value)
+            elif column == 'image':
+                value = field.to_representation(
+                    ImageFieldFile(None, image_field, value))
+            elif column == 'rendered_image':
+                value = field.get_urls(image_field.storage, value) if (
+                    value and value == row['image']) else None
+            representation[field.field_name] = value
+        return representation
+
+    def _is_author_subscribed(self, recipe):
         user = self.context['request'].user
-        return (user.is_authenticated
-                and user.favorites.filter(recipe=obj).exists())
+        if not user.is_authenticated:
+            return False
+        subscribed = getattr(recipe, 'is_author_subscribed', None)
+        if subscribed is None:
+            return user.subscriber.filter(author_id=recipe.author_id).exists()
+        return subscribed
+
+    def _check_user_relation(self, obj, model, annotation):
+        user = self.context['request'].user
+        if not user.is_authenticated:
+            return False
+        value = getattr(obj, annotation, None)
+        if value is None:
+            return model.objects.filter(user=user, recipe=obj).exists()
+        return value
 
     def get_is_favorited(self, obj):
-        return self._check_user_relation(obj, Favorite)
+        return self._check_user_relation(obj, Favorite, 'is_favorited_by_me')
 
     def get_is_in_shopping_cart(self, obj):
-        return self._check_user_relation(obj, ShoppingCart)
+        return self._check_user_relation(
+            obj, ShoppingCart, 'is_in_my_shopping_cart')
+
+
+class RecipeByIngredientsSerializer(RecipeSerializer):
+    matched_ingredients = serializers.IntegerField(
+        source='matched', read_only=True)
+    missing_ingredients = serializers.IntegerField(
+        source='missing', read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + (
+            'matched_ingredients', 'missing_ingredients',
+        )
 
 
 class CreateRecipeSerializer(serializers.ModelSerializer):
@@ -223,6 +431,18 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             'cooking_time',
         )
 
+    def to_internal_value(self, data):
+        # В multipart-запросе ингредиенты приходят JSON-строкой.
+        if html.is_html_input(data) and isinstance(
+                data.get('ingredients'), str):
+            data = data.dict()
+            try:
+                data['ingredients'] = json.loads(data['ingredients'])
+            except ValueError:
+                raise serializers.ValidationError(
+                    {'ingredients': 'Некорректный JSON списка ингредиентов.'})
+        return super().to_internal_value(data)
+
     def validate_cooking_time(self, value):
         if value < MIN_COOKING_TIME:
             raise ValidationError(
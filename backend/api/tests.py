@@ -1,16 +1,86 @@
+import asyncio
+import base64
+import hashlib
+import json
+import marshal
+import os
+import shutil
+import tempfile
 from http import HTTPStatus
+from io import BytesIO, StringIO
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
+from urllib.parse import parse_qs, urlsplit
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError
+from asgiref.sync import async_to_sync, sync_to_async
+from django.http import HttpResponse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import (
+    AsyncClient,
+    Client,
+    RequestFactory,
+    TestCase,
+    override_settings
+)
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import lazy
+from PIL import Image
+from prometheus_client import REGISTRY
+from rest_framework.exceptions import ValidationError
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
 
-from recipes.models import Ingredient, Recipe, RecipeIngredient
+from api import async_views
+from api.fields import Base64ImageField
+from api.renderers import FastJSONRenderer
+from recipes.admin import EstimatedCountPaginator
+from backend import db_router
+from backend.metrics import MetricsMiddleware
+from backend.settings import SEARCH_CONFIG
+from backend.index_advisor import (
+    classify,
+    find_seq_scans,
+    get_models,
+    suggest_migrations
+)
+from backend.startup import profile_startup
+from backend.storage import ContentAddressedStorage
+
+from recipes.cache import get_fragment_stats
+from recipes.images import normalize_image
+from recipes.models import (
+    Favorite,
+    FeedBackfill,
+    FeedEntry,
+    ImageJob,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RequestProfile,
+    ShoppingCart,
+    ShortLink,
+    Tombstone,
+    TrendingScore
+)
+from recipes.trending import update_trending
+from users.models import Subscription
 
 User = get_user_model()
 
 
 class RecipesAPITestCase(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.user = User.objects.create_user(
             username='testuser',
@@ -26,6 +96,18 @@ class RecipesAPITestCase(TestCase):
         response = self.client.get(reverse('ingredients-list'))
         self.assertEqual(response.status_code, HTTPStatus.OK)
 
+    def test_ingredient_catalogue_cached_and_invalidated(self):
+        self.client.get(reverse('ingredients-list'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('ingredients-list'))
+        self.assertEqual(
+            [item['name'] for item in response.json()],
+            ['Тестовый ингредиент']
+        )
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        response = self.client.get(reverse('ingredients-list'))
+        self.assertEqual(len(response.json()), 2)
+
     def test_recipes_list_exists(self):
         response = self.client.get(reverse('recipes-list'))
         self.assertEqual(response.status_code, HTTPStatus.OK)
@@ -61,3 +143,1421 @@ class RecipesAPITestCase(TestCase):
         )
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertEqual(response.data['name'], 'Тестовый рецепт')
+
+    def test_recipe_search_uses_russian_stemming(self):
+        Recipe.objects.create(
+            author=self.user,
+            name='Жареная картошка',
+            text='Картошка с грибами и луком',
+            cooking_time=30
+        )
+        Recipe.objects.create(
+            author=self.user,
+            name='Салат',
+            text='Огурцы и помидоры',
+            cooking_time=10
+        )
+        response = self.client.get(
+            reverse('recipes-list'), {'search': 'гриб'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            [recipe['name'] for recipe in response.data['results']],
+            ['Жареная картошка']
+        )
+
+    def test_search_trigger_uses_search_config(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT prosrc FROM pg_proc '
+                "WHERE proname = 'recipes_recipe_search_vector_update'")
+            source = cursor.fetchone()[0]
+        self.assertIn(f"'{SEARCH_CONFIG}'", source)
+
+    def test_recipes_by_ingredients_ranked_by_coverage(self):
+        onion = Ingredient.objects.create(name='Лук', measurement_unit='г')
+        salt = Ingredient.objects.create(name='Соль', measurement_unit='г')
+        partial = Recipe.objects.create(
+            author=self.user, name='Частичный', text='-', cooking_time=5
+        )
+        full = Recipe.objects.create(
+            author=self.user, name='Полный', text='-', cooking_time=5
+        )
+        unrelated = Recipe.objects.create(
+            author=self.user, name='Другой', text='-', cooking_time=5
+        )
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=partial, ingredients=onion, amount=1),
+            RecipeIngredient(
+                recipe=partial, ingredients=self.ingredient, amount=1),
+            RecipeIngredient(recipe=full, ingredients=onion, amount=1),
+            RecipeIngredient(recipe=full, ingredients=salt, amount=1),
+            RecipeIngredient(
+                recipe=unrelated, ingredients=self.ingredient, amount=1),
+        ])
+        response = self.client.get(
+            reverse('recipes-by-ingredients'),
+            {'ingredients': f'{onion.id},{salt.id}'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            [
+                (recipe['name'], recipe['matched_ingredients'],
+                 recipe['missing_ingredients'])
+                for recipe in response.data['results']
+            ],
+            [('Полный', 2, 0), ('Частичный', 1, 1)]
+        )
+        response = self.client.get(
+            reverse('recipes-by-ingredients'),
+            {'ingredients': f'{onion.id},{salt.id}',
+             'exclude_ingredients': str(salt.id)}
+        )
+        self.assertEqual(
+            [recipe['name'] for recipe in response.data['results']],
+            ['Частичный']
+        )
+
+    def test_recipes_by_ingredients_rejects_invalid_ids(self):
+        response = self.client.get(
+            reverse('recipes-by-ingredients'), {'ingredients': 'abc'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_recipe_filter_by_ingredients_and_cooking_time(self):
+        onion = Ingredient.objects.create(name='Лук', measurement_unit='г')
+        soup = Recipe.objects.create(
+            author=self.user, name='Суп', text='-', cooking_time=40
+        )
+        salad = Recipe.objects.create(
+            author=self.user, name='Салат', text='-', cooking_time=10
+        )
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=soup, ingredients=onion, amount=1),
+            RecipeIngredient(
+                recipe=soup, ingredients=self.ingredient, amount=1),
+            RecipeIngredient(
+                recipe=salad, ingredients=self.ingredient, amount=1),
+        ])
+        cases = (
+            ({'ingredients': f'{onion.id},{self.ingredient.id}'}, ['Суп']),
+            ({'exclude_ingredients': str(onion.id)}, ['Салат']),
+            ({'max_cooking_time': 15}, ['Салат']),
+            ({'min_cooking_time': 15, 'max_cooking_time': 60}, ['Суп']),
+        )
+        for params, expected in cases:
+            with self.subTest(params=params):
+                response = self.client.get(reverse('recipes-list'), params)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(
+                    [recipe['name'] for recipe in response.data['results']],
+                    expected
+                )
+        for params in ({'ingredients': f'{onion.id}.9'},
+                       {'exclude_ingredients': f'{onion.id},1.5'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('recipes-list'), params)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_anonymous_recipe_list_is_cached_and_invalidated(self):
+        url = reverse('recipes-list')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.data['count'], 0)
+
+        Recipe.objects.create(
+            author=self.user, name='Новый', text='-', cooking_time=5
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.data['count'], 1)
+
+        self.user.first_name = 'Изменённое'
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(
+            response.data['results'][0]['author']['first_name'],
+            'Изменённое'
+        )
+
+    def test_anonymous_recipe_detail_revalidation(self):
+        recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='-', cooking_time=5
+        )
+        url = reverse('recipes-detail', kwargs={'pk': recipe.id})
+        response = self.client.get(url)
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredients=self.ingredient, amount=10
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.data['ingredients']), 1)
+
+    def test_recipe_fragments_cached_with_viewer_flags(self):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass'
+        )
+        favorite = Recipe.objects.create(
+            author=author, name='Избранный', text='-', cooking_time=5
+        )
+        in_cart = Recipe.objects.create(
+            author=self.user, name='В корзине', text='-', cooking_time=5
+        )
+        Favorite.objects.create(user=self.user, recipe=favorite)
+        ShoppingCart.objects.create(user=self.user, recipe=in_cart)
+        Subscription.objects.create(subscriber=self.user, author=author)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        client.get(reverse('recipes-list'))
+        hits_before, _ = get_fragment_stats()
+        with self.assertNumQueries(2):
+            response = client.get(reverse('recipes-list'))
+        hits_after, _ = get_fragment_stats()
+        self.assertEqual(hits_after - hits_before, 2)
+
+        flags = {
+            recipe['name']: (
+                recipe['is_favorited'],
+                recipe['is_in_shopping_cart'],
+                recipe['author']['is_subscribed'],
+            )
+            for recipe in response.data['results']
+        }
+        self.assertEqual(flags, {
+            'Избранный': (True, False, True),
+            'В корзине': (False, True, False),
+        })
+
+
+def make_png(size=(32, 16)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class Base64ImageFieldTestCase(TestCase):
+    def _data_uri(self, size=(32, 16)):
+        encoded = base64.b64encode(make_png(size)).decode()
+        return f'data:image/png;base64,{encoded}'
+
+    def test_decodes_in_chunks(self):
+        with mock.patch('api.fields.BASE64_CHUNK_SIZE', 8):
+            file = Base64ImageField().to_internal_value(self._data_uri())
+        self.assertEqual(file.name, 'image.png')
+        with Image.open(file) as image:
+            self.assertEqual(image.size, (32, 16))
+
+    def test_rejects_declared_size_over_limit(self):
+        with mock.patch('api.fields.MAX_IMAGE_SIZE', 10), mock.patch(
+                'api.fields.base64.b64decode') as b64decode:
+            with self.assertRaises(ValidationError):
+                Base64ImageField().to_internal_value(self._data_uri())
+        b64decode.assert_not_called()
+
+    def test_rejects_too_many_pixels(self):
+        with mock.patch('api.fields.MAX_IMAGE_PIXELS', 100):
+            with self.assertRaises(ValidationError):
+                Base64ImageField().to_internal_value(self._data_uri())
+
+    def test_rejects_invalid_base64_and_format(self):
+        for data in ('data:image/png;base64,@@@@',
+                     'data:image/svg+xml;base64,AAAA'):
+            with self.subTest(data=data):
+                with self.assertRaises(ValidationError):
+                    Base64ImageField().to_internal_value(data)
+
+
+class MultipartUploadTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.ingredient = Ingredient.objects.create(
+            name='Тестовый ингредиент',
+            measurement_unit='г'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_create_recipe_with_multipart_image(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            response = self.client.post(reverse('recipes-list'), {
+                'name': 'Рецепт',
+                'text': 'Описание',
+                'cooking_time': 10,
+                'ingredients': json.dumps(
+                    [{'id': self.ingredient.id, 'amount': 5}]),
+                'image': SimpleUploadedFile(
+                    'photo.png', make_png(), content_type='image/png'),
+            }, format='multipart')
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(len(response.data['ingredients']), 1)
+        self.assertTrue(Recipe.objects.get(pk=response.data['id']).image)
+
+    def test_image_renditions_generated_on_upload(self):
+        recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='-', cooking_time=5)
+        with override_settings(MEDIA_ROOT=self.media_root):
+            recipe.image.save(
+                'photo.png', SimpleUploadedFile(
+                    'photo.png', make_png((2000, 1000))))
+            response = self.client.get(
+                reverse('recipes-detail', kwargs={'pk': recipe.id}))
+            self.assertIsNone(response.data['image_renditions'])
+
+            call_command('process_image_jobs', once=True, stdout=StringIO())
+            self.assertEqual(
+                ImageJob.objects.get(object_id=recipe.id).status,
+                ImageJob.DONE)
+            response = self.client.get(
+                reverse('recipes-detail', kwargs={'pk': recipe.id}))
+            renditions = response.data['image_renditions']
+            self.assertEqual(set(renditions), {'thumb', 'card', 'full'})
+            self.assertEqual(set(renditions['thumb']), {'webp', 'jpeg'})
+            thumb = os.path.join(
+                self.media_root,
+                renditions['thumb']['webp'].split('/media/')[-1])
+            with Image.open(thumb) as image:
+                self.assertEqual(image.size, (160, 80))
+
+            # Готовность копий записана в модели, хранилище не опрашивается.
+            cache.clear()
+            with mock.patch.object(
+                    ContentAddressedStorage, 'exists') as exists:
+                for query in ({}, {'fields': 'id,image_renditions'}):
+                    response = self.client.get(reverse('recipes-list'), query)
+                    self.assertEqual(
+                        response.data['results'][0]['image_renditions'],
+                        renditions, query)
+            exists.assert_not_called()
+
+            recipe.refresh_from_db()
+            recipe.image.save(
+                'other.png', SimpleUploadedFile(
+                    'other.png', make_png((300, 300))))
+            response = self.client.get(
+                reverse('recipes-list'), {'fields': 'id,image_renditions'})
+            self.assertIsNone(response.data['results'][0]['image_renditions'])
+
+    def test_generate_renditions_command_invalidates_cache(self):
+        recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='-', cooking_time=5)
+        url = reverse('recipes-detail', kwargs={'pk': recipe.id})
+        with override_settings(MEDIA_ROOT=self.media_root):
+            recipe.image.save(
+                'photo.png', SimpleUploadedFile('photo.png', make_png()))
+            self.assertIsNone(self.client.get(url).data['image_renditions'])
+            call_command('generate_renditions', stdout=StringIO())
+            self.assertIsNotNone(
+                self.client.get(url).data['image_renditions'])
+
+            # Копии, созданные до появления поля, только отмечаются.
+            Recipe.objects.filter(pk=recipe.pk).update(rendered_image='')
+            with mock.patch(
+                    'recipes.images.generate_renditions') as generate:
+                call_command('generate_renditions', stdout=StringIO())
+            generate.assert_not_called()
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.rendered_image, recipe.image.name)
+
+
+class ContentAddressedStorageTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    def test_identical_uploads_are_stored_once(self):
+        content = make_png()
+        with override_settings(MEDIA_ROOT=self.media_root):
+            first = Recipe.objects.create(
+                author=self.user, name='Первый', text='-', cooking_time=5)
+            second = Recipe.objects.create(
+                author=self.user, name='Второй', text='-', cooking_time=5)
+            first.image.save('a.png', SimpleUploadedFile('a.png', content))
+            second.image.save('b.png', SimpleUploadedFile('b.png', content))
+            self.assertEqual(first.image.name, second.image.name)
+            self.assertTrue(first.image.name.startswith('recipes/images/'))
+            self.assertTrue(first.image.name.endswith('.png'))
+
+    def test_garbage_collection_keeps_referenced_files(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            recipe = Recipe.objects.create(
+                author=self.user, name='Рецепт', text='-', cooking_time=5)
+            recipe.image.save(
+                'a.png', SimpleUploadedFile('a.png', make_png((10, 10))))
+            orphan = recipe.image.name
+            recipe.image.save(
+                'b.png', SimpleUploadedFile('b.png', make_png((20, 20))))
+            kept = recipe.image.name
+            ImageJob.objects.all().delete()
+
+            call_command(
+                'collect_media_garbage', grace_period=0, stdout=StringIO())
+            self.assertFalse(default_storage.exists(orphan))
+            self.assertTrue(default_storage.exists(kept))
+
+    def test_client_filename_is_not_trusted(self):
+        content = make_png()
+        digest = hashlib.sha256(content).hexdigest()
+        with override_settings(MEDIA_ROOT=self.media_root):
+            recipe = Recipe.objects.create(
+                author=self.user, name='Рецепт', text='-', cooking_time=5)
+            recipe.image.save(
+                f'{"a" * 64}.png', SimpleUploadedFile('x.png', content))
+            self.assertEqual(
+                recipe.image.name,
+                f'recipes/images/{digest[:2]}/{digest}.png')
+
+    def test_duplicate_upload_refreshes_grace_period(self):
+        content = make_png()
+        with override_settings(MEDIA_ROOT=self.media_root):
+            name = default_storage.save(
+                'users/a.png', SimpleUploadedFile('a.png', content))
+            os.utime(default_storage.path(name), (0, 0))
+            self.assertEqual(default_storage.save(
+                'users/b.png', SimpleUploadedFile('b.png', content)), name)
+            call_command('collect_media_garbage', stdout=StringIO())
+            self.assertTrue(default_storage.exists(name))
+
+    def test_normalized_image_is_named_by_its_content(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            recipe = Recipe.objects.create(
+                author=self.user, name='Рецепт', text='-', cooking_time=5)
+            recipe.image.save(
+                'photo.png', SimpleUploadedFile(
+                    'photo.png', make_png((4000, 100))))
+            original = recipe.image.name
+            call_command('process_image_jobs', once=True, stdout=StringIO())
+            recipe.refresh_from_db()
+            self.assertNotEqual(recipe.image.name, original)
+            with recipe.image.open('rb') as image:
+                digest = hashlib.sha256(image.read()).hexdigest()
+            self.assertEqual(
+                recipe.image.name,
+                f'recipes/images/{digest[:2]}/{digest}.png')
+
+    def test_stale_image_job_keeps_newer_upload(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            recipe = Recipe.objects.create(
+                author=self.user, name='Рецепт', text='-', cooking_time=5)
+            recipe.image.save(
+                'old.png', SimpleUploadedFile(
+                    'old.png', make_png((4000, 100))))
+            newer = default_storage.save(
+                'recipes/images/new.png',
+                SimpleUploadedFile('new.png', make_png((10, 10))))
+
+            def normalize_and_replace(field_file):
+                # Новая картинка загружена, пока обрабатывалась старая.
+                name = normalize_image(field_file)
+                Recipe.objects.filter(pk=recipe.pk).update(image=newer)
+                return name
+
+            with mock.patch(
+                    'recipes.jobs.normalize_image',
+                    side_effect=normalize_and_replace):
+                call_command(
+                    'process_image_jobs', once=True, stdout=StringIO())
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.image.name, newer)
+            self.assertEqual(recipe.rendered_image, '')
+
+    def test_deleting_avatar_keeps_shared_file(self):
+        content = make_png()
+        other = User.objects.create_user(
+            username='other', email='other@example.com', password='pass')
+        with override_settings(MEDIA_ROOT=self.media_root):
+            for user in (self.user, other):
+                user.avatar.save('a.png', SimpleUploadedFile('a.png', content))
+            client = APIClient()
+            client.force_authenticate(self.user)
+            response = client.delete(reverse('users-me-avatar'))
+            self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+            other.refresh_from_db()
+            self.assertTrue(default_storage.exists(other.avatar.name))
+
+
+class ShoppingCartExportTestCase(TestCase):
+    def setUp(self):
+        self.exports_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.exports_root, True)
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г')
+        recipe = Recipe.objects.create(
+            author=self.user, name='Блины', text='-', cooking_time=20)
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredients=ingredient, amount=200)
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _download(self):
+        with mock.patch('api.exports.EXPORTS_ROOT', self.exports_root):
+            return self.client.get(reverse('recipes-download-shopping-cart'))
+
+    def test_download_streams_generated_pdf(self):
+        response = self._download()
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(
+            b'%PDF'))
+
+    def test_download_delegates_to_nginx(self):
+        with mock.patch('api.exports.USE_X_ACCEL_REDIRECT', True):
+            response = self._download()
+            repeated = self._download()
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.content, b'')
+        self.assertTrue(response['X-Accel-Redirect'].startswith(
+            '/protected/exports/shopping_cart/'))
+        self.assertEqual(
+            response['X-Accel-Redirect'], repeated['X-Accel-Redirect'])
+
+    def test_reused_pdf_is_kept_by_prune(self):
+        with mock.patch('api.exports.USE_X_ACCEL_REDIRECT', True):
+            name = self._download()['X-Accel-Redirect'].split(
+                '/protected/exports/')[-1]
+            path = os.path.join(self.exports_root, name)
+            os.utime(path, (0, 0))
+            self._download()
+        with mock.patch(
+                'recipes.management.commands.prune_exports.EXPORTS_ROOT',
+                self.exports_root):
+            call_command('prune_exports', stdout=StringIO())
+        self.assertTrue(os.path.exists(path))
+
+    def test_failed_render_leaves_no_temporary_file(self):
+        with mock.patch(
+                'api.exports.draw_shopping_cart', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                self._download()
+        directory = os.path.join(self.exports_root, 'shopping_cart')
+        self.assertEqual(os.listdir(directory), [])
+
+
+class AsyncViewsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        Ingredient.objects.create(name='Тмин', measurement_unit='г')
+        Ingredient.objects.create(name='Тыква', measurement_unit='кг')
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='-', cooking_time=5)
+
+    def test_ingredient_list_matches_sync_view(self):
+        params = {'name': 'Тм'}
+        response = async_to_sync(async_views.ingredient_list)(
+            self.factory.get('/api/ingredients/', params))
+        self.assertEqual(
+            json.loads(response.content),
+            self.client.get(reverse('ingredients-list'), params).json()
+        )
+
+    def test_anonymous_recipe_detail_served_from_cache(self):
+        url = reverse('recipes-detail', kwargs={'pk': self.recipe.id})
+        expected = self.client.get(url).json()
+        with self.assertNumQueries(0):
+            response = async_to_sync(async_views.recipe_detail)(
+                self.factory.get(url), pk=self.recipe.id)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(json.loads(response.content), expected)
+        self.assertIn('ETag', response)
+
+    def test_short_link_redirect(self):
+        link = ShortLink.objects.create(key='abc123', recipe=self.recipe)
+        response = async_to_sync(async_views.short_link_redirect)(
+            self.factory.get('/api/s/abc123/'), key=link.key)
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(response.url, f'/recipes/{self.recipe.id}/')
+
+    def test_errors_match_sync_views(self):
+        missing = self.client.get(
+            reverse('ingredients-detail', kwargs={'pk': 0}))
+        for view, kwargs in (
+                (async_views.ingredient_detail, {'pk': 0}),
+                (async_views.short_link_redirect, {'key': 'missing'})):
+            response = async_to_sync(view)(self.factory.get('/'), **kwargs)
+            self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+            self.assertEqual(json.loads(response.content), missing.json())
+        for method in ('post', 'delete'):
+            response = async_to_sync(async_views.ingredient_list)(
+                getattr(self.factory, method)('/api/ingredients/'))
+            self.assertEqual(
+                response.status_code, HTTPStatus.METHOD_NOT_ALLOWED)
+            self.assertEqual(response['Allow'], 'GET, HEAD')
+            self.assertIn('detail', json.loads(response.content))
+
+
+class BootstrapCommandTestCase(TestCase):
+    command = 'recipes.management.commands.bootstrap.call_command'
+
+    def test_imports_once_and_skips_when_bootstrapped(self):
+        with mock.patch(self.command) as inner:
+            call_command('bootstrap', stdout=StringIO())
+        self.assertIn(mock.call('import_recipes'), inner.call_args_list)
+        self.assertNotIn(
+            mock.call('migrate', interactive=False), inner.call_args_list)
+
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        out = StringIO()
+        with mock.patch(self.command) as inner:
+            call_command('bootstrap', stdout=out)
+        inner.assert_not_called()
+        self.assertIn('already bootstrapped', out.getvalue())
+
+
+class StartupProfileTestCase(TestCase):
+    # Бюджет проверяется по процессорному времени, которое не растёт от
+    # параллельной нагрузки, с запасом в несколько раз к обычному запуску.
+    max_cpu_seconds = 3
+    max_rss_mb = 120
+    deferred_packages = ('reportlab', 'PIL', 'numpy', 'scipy')
+
+    def test_wsgi_import_defers_heavy_packages(self):
+        profile = profile_startup('backend.wsgi')
+        loaded = {name.split('.')[0] for name in profile['modules']}
+        for package in self.deferred_packages:
+            self.assertNotIn(package, loaded)
+
+    def test_wsgi_import_within_budget(self):
+        profile = profile_startup('backend.wsgi')
+        self.assertLess(profile['cpu_seconds'], self.max_cpu_seconds)
+        self.assertLess(profile['max_rss_kb'] / 1024, self.max_rss_mb)
+
+
+@mock.patch.object(db_router, 'REPLICA_DATABASES', ['replica0', 'replica1'])
+class ReplicaRouterTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = db_router.ReplicaRouter()
+        patcher = mock.patch.dict(db_router._replica_lag, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def route(self, request, write=False):
+        databases = []
+
+        def get_response(request):
+            if write:
+                self.router.db_for_write(Recipe)
+            databases.append(self.router.db_for_read(Recipe))
+            databases.append(self.router.db_for_read(Ingredient))
+            return HttpResponse()
+
+        response = db_router.ReplicaRoutingMiddleware(get_response)(request)
+        return databases, response
+
+    @mock.patch.object(db_router, 'get_replica_lag', return_value=0)
+    def test_safe_requests_read_from_one_replica(self, get_lag):
+        databases, response = self.route(self.factory.get('/api/recipes/'))
+        self.assertIn(databases[0], ('replica0', 'replica1'))
+        self.assertEqual(databases[0], databases[1])
+        self.assertNotIn(db_router.PRIMARY_COOKIE, response.cookies)
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    @mock.patch.object(db_router, 'get_replica_lag', return_value=0)
+    def test_reads_stick_to_primary_after_write(self, get_lag):
+        databases, response = self.route(
+            self.factory.post('/api/recipes/'), write=True)
+        self.assertEqual(databases, ['default', 'default'])
+        self.assertIn(db_router.PRIMARY_COOKIE, response.cookies)
+
+        request = self.factory.get('/api/recipes/')
+        request.COOKIES[db_router.PRIMARY_COOKIE] = '1'
+        databases, _ = self.route(request)
+        self.assertEqual(databases, ['default', 'default'])
+
+        databases, response = self.route(
+            self.factory.get('/api/recipes/1/get-link/'), write=True)
+        self.assertEqual(databases, ['default', 'default'])
+        self.assertIn(db_router.PRIMARY_COOKIE, response.cookies)
+
+    def test_lagging_or_failed_replicas_are_skipped(self):
+        lags = {'replica0': 60, 'replica1': None}
+
+        def get_lag(alias):
+            if lags[alias] is None:
+                raise DatabaseError
+            return lags[alias]
+
+        with mock.patch.object(
+                db_router, 'get_replica_lag', side_effect=get_lag) as lag:
+            databases, _ = self.route(self.factory.get('/api/recipes/'))
+            self.assertEqual(databases, ['default', 'default'])
+
+            # Результат проверки кэшируется на REPLICA_LAG_CHECK_INTERVAL.
+            lags['replica1'] = 1
+            databases, _ = self.route(self.factory.get('/api/recipes/'))
+            self.assertEqual(databases, ['default', 'default'])
+            self.assertEqual(lag.call_count, 2)
+
+            db_router._replica_lag.clear()
+            databases, _ = self.route(self.factory.get('/api/recipes/'))
+            self.assertEqual(databases, ['replica1', 'replica1'])
+
+    def test_middleware_stays_async_under_asgi(self):
+        databases = []
+
+        async def get_response(request):
+            # Запись в потоке sync_to_async видна корутине запроса.
+            await sync_to_async(self.router.db_for_write)(Recipe)
+            databases.append(self.router.db_for_read(Recipe))
+            return HttpResponse()
+
+        middleware = db_router.ReplicaRoutingMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(self.factory.post('/api/'))
+        self.assertEqual(databases, ['default'])
+        self.assertIn(db_router.PRIMARY_COOKIE, response.cookies)
+
+
+class AdminChangelistTestCase(TestCase):
+    changelists = (
+        'admin:recipes_recipe_changelist',
+        'admin:recipes_favorite_changelist',
+        'admin:recipes_shoppingcart_changelist',
+        'admin:recipes_recipeingredient_changelist',
+    )
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.client.force_login(self.admin)
+        self.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г')
+
+    def add_rows(self, count):
+        for _ in range(count):
+            user = User.objects.create_user(
+                username=f'user{User.objects.count()}',
+                email=f'user{User.objects.count()}@example.com',
+                password='pass',
+            )
+            recipe = Recipe.objects.create(
+                author=user, name='Рецепт', text='-', cooking_time=5)
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredients=self.ingredient, amount=1)
+            Favorite.objects.create(user=user, recipe=recipe)
+            ShoppingCart.objects.create(user=self.admin, recipe=recipe)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.add_rows(2)
+        counts = [self.count_queries(reverse(name))
+                  for name in self.changelists]
+        self.add_rows(3)
+        self.assertEqual(
+            [self.count_queries(reverse(name)) for name in self.changelists],
+            counts
+        )
+
+    def test_input_filters(self):
+        self.add_rows(2)
+        url = reverse('admin:recipes_favorite_changelist')
+        response = self.client.get(url, {'user': 'user1'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response = self.client.get(url, {'recipe': 'abc'})
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_paginator_uses_estimate_for_unfiltered_lists(self):
+        self.add_rows(2)
+        with mock.patch('recipes.admin.ADMIN_EXACT_COUNT_LIMIT', -2), \
+                CaptureQueriesContext(connection) as queries:
+            EstimatedCountPaginator(Recipe.objects.all(), 10).count
+            filtered = EstimatedCountPaginator(
+                Recipe.objects.filter(author=self.admin), 10).count
+        self.assertEqual(filtered, 0)
+        self.assertIn('reltuples', queries[0]['sql'])
+        self.assertEqual(len(queries), 2)
+
+
+@mock.patch('recipes.feed.FEED_FANOUT_MAX_SUBSCRIBERS', 1)
+class FeedTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader, self.author, self.star, self.fan = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com', password='pass')
+            for name in ('reader', 'author', 'star', 'fan')
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def create_recipe(self, author, name):
+        return Recipe.objects.create(
+            author=author, name=name, text='-', cooking_time=5)
+
+    def feed(self, **params):
+        response = self.client.get(reverse('recipes-feed'), params)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return response.json()
+
+    def test_feed_combines_fan_out_and_popular_authors(self):
+        old = self.create_recipe(self.author, 'Старый')
+        Subscription.objects.create(subscriber=self.reader, author=self.author)
+        Subscription.objects.create(subscriber=self.fan, author=self.star)
+        Subscription.objects.create(subscriber=self.reader, author=self.star)
+        self.star.refresh_from_db()
+        self.assertEqual(self.star.subscribers_count, 2)
+
+        new = self.create_recipe(self.author, 'Новый')
+        popular = self.create_recipe(self.star, 'Популярный')
+        self.create_recipe(self.fan, 'Чужой')
+        self.assertEqual(
+            set(FeedEntry.objects.filter(user=self.reader)
+                .values_list('recipe_id', flat=True)),
+            {old.id, new.id}
+        )
+        self.assertFalse(FeedEntry.objects.filter(recipe=popular).exists())
+
+        page = self.feed(limit=2)
+        self.assertEqual(
+            [recipe['id'] for recipe in page['results']],
+            [popular.id, new.id]
+        )
+        before = parse_qs(urlsplit(page['next']).query)['before']
+        page = self.feed(limit=2, before=before[0])
+        self.assertEqual(
+            [recipe['id'] for recipe in page['results']], [old.id])
+        self.assertIsNone(page['next'])
+
+    def test_unsubscribe_removes_entries(self):
+        self.create_recipe(self.author, 'Рецепт')
+        subscription = Subscription.objects.create(
+            subscriber=self.reader, author=self.author)
+        subscription.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 0)
+        self.assertEqual(self.feed()['results'], [])
+        response = self.client.get(reverse('recipes-feed'), {'before': 'x'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_author_below_threshold_is_fanned_out_again(self):
+        Subscription.objects.create(subscriber=self.reader, author=self.star)
+        fan = Subscription.objects.create(
+            subscriber=self.fan, author=self.star)
+        popular = self.create_recipe(self.star, 'Популярный')
+        self.assertFalse(FeedEntry.objects.filter(recipe=popular).exists())
+
+        # Отписка только ставит автора в очередь, а его рецепты до
+        # дозаполнения подмешиваются при чтении.
+        with self.assertNumQueries(8):
+            fan.delete()
+        self.assertFalse(FeedEntry.objects.filter(recipe=popular).exists())
+        self.assertEqual(
+            [recipe['id'] for recipe in self.feed()['results']],
+            [popular.id])
+
+        call_command('rebuild_feeds', pending=True, stdout=StringIO())
+        self.assertEqual(
+            list(FeedEntry.objects.filter(recipe=popular)
+                 .values_list('user_id', flat=True)),
+            [self.reader.id]
+        )
+        self.assertFalse(FeedBackfill.objects.exists())
+        self.assertEqual(
+            [recipe['id'] for recipe in self.feed()['results']],
+            [popular.id])
+
+
+class RecommendationsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            User.objects.create_user(
+                username=f'user{index}',
+                email=f'user{index}@example.com',
+                password='pass',
+            )
+            for index in range(3)
+        ]
+        self.recipes = {
+            name: Recipe.objects.create(
+                author=self.users[0], name=name, text='-', cooking_time=5)
+            for name in 'abcd'
+        }
+        favorites = {0: 'ab', 1: 'abc', 2: 'cd'}
+        for index, names in favorites.items():
+            for name in names:
+                Favorite.objects.create(
+                    user=self.users[index], recipe=self.recipes[name])
+        call_command('compute_recommendations', stdout=StringIO())
+        self.client = APIClient()
+
+    def names(self, response):
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [recipe['name'] for recipe in response.json()]
+
+    def test_similar_recipes_ranked_by_cosine(self):
+        url = reverse('recipes-similar', kwargs={'pk': self.recipes['a'].id})
+        self.assertEqual(self.names(self.client.get(url)), ['b', 'c'])
+        response = self.client.get(
+            reverse('recipes-similar', kwargs={'pk': 0}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_recommendations_exclude_favorites(self):
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(
+            self.names(self.client.get(reverse('recipes-recommended'))),
+            ['c']
+        )
+        self.client.force_authenticate(self.users[2])
+        self.assertEqual(
+            sorted(self.names(
+                self.client.get(reverse('recipes-recommended')))),
+            ['a', 'b']
+        )
+
+
+class TrendingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='pass')
+        self.fresh, self.old, self.legacy = (
+            Recipe.objects.create(
+                author=self.user, name=name, text='-', cooking_time=5)
+            for name in ('Свежий', 'Старый', 'Без даты')
+        )
+        self.add(Favorite, self.fresh, hours=1)
+        self.add(Favorite, self.old, hours=48)
+        self.add(ShoppingCart, self.old, hours=47)
+        Favorite.objects.create(
+            user=self.user, recipe=self.legacy, created_at=None)
+
+    def add(self, model, recipe, hours, user=None):
+        return model.objects.create(
+            user=user or self.user,
+            recipe=recipe,
+            created_at=self.now - timedelta(hours=hours),
+        )
+
+    def scores(self):
+        return dict(TrendingScore.objects.values_list('recipe_id', 'score'))
+
+    def test_trending_ranked_by_decayed_score(self):
+        update_trending(now=self.now)
+        self.assertEqual(set(self.scores()), {self.fresh.id, self.old.id})
+        response = self.client.get(reverse('recipes-trending'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            [recipe['name'] for recipe in response.json()['results']],
+            ['Свежий', 'Старый']
+        )
+
+    def test_incremental_update_matches_rebuild(self):
+        update_trending(now=self.now)
+        other = User.objects.create_user(
+            username='other', email='other@example.com', password='pass')
+        self.add(Favorite, self.old, hours=-1, user=other)
+        later = self.now + timedelta(hours=2)
+        update_trending(now=later)
+        incremental = self.scores()
+        update_trending(rebuild=True, now=later)
+        rebuilt = self.scores()
+        self.assertEqual(set(incremental), set(rebuilt))
+        for recipe_id, score in rebuilt.items():
+            self.assertAlmostEqual(incremental[recipe_id], score)
+
+    def test_event_committed_after_run_is_counted(self):
+        update_trending(now=self.now)
+        # Транзакция началась до пересчёта, а закоммитилась после него.
+        Favorite.objects.create(
+            user=User.objects.create_user(
+                username='late', email='late@example.com', password='pass'),
+            recipe=self.legacy,
+            created_at=self.now - timedelta(seconds=1),
+        )
+        update_trending(now=self.now + timedelta(minutes=5))
+        self.assertIn(self.legacy.id, self.scores())
+
+
+@mock.patch('recipes.sync.SYNC_CURSOR_MARGIN', 0)
+class SyncTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.first, self.second, self.third = (
+            Recipe.objects.create(
+                author=self.user, name=name, text='-', cooking_time=5)
+            for name in ('Первый', 'Второй', 'Третий')
+        )
+        Favorite.objects.create(user=self.user, recipe=self.first)
+        ShoppingCart.objects.create(user=self.user, recipe=self.second)
+
+    def sync(self, cursor=None):
+        params = {'updated_since': cursor} if cursor else {}
+        response = self.client.get(reverse('recipes-sync'), params)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return response.json()
+
+    def updated_ids(self, data):
+        return [recipe['id'] for recipe in data['recipes']['updated']]
+
+    def test_delta_contains_only_changes_since_cursor(self):
+        snapshot = self.sync()
+        self.assertTrue(snapshot['reset'])
+        self.assertEqual(
+            sorted(self.updated_ids(snapshot)),
+            sorted((self.first.id, self.second.id, self.third.id))
+        )
+        self.assertEqual(snapshot['favorites']['added'], [self.first.id])
+        self.assertEqual(
+            self.sync(snapshot['cursor'])['recipes']['updated'], [])
+
+        self.first.name = 'Первый, исправленный'
+        self.first.save()
+        third_id = self.third.id
+        self.third.delete()
+        Favorite.objects.create(user=self.user, recipe=self.second)
+        ShoppingCart.objects.filter(user=self.user).delete()
+
+        delta = self.sync(snapshot['cursor'])
+        self.assertFalse(delta['reset'])
+        self.assertEqual(self.updated_ids(delta), [self.first.id])
+        self.assertEqual(delta['recipes']['deleted'], [third_id])
+        self.assertEqual(
+            delta['favorites'], {'added': [self.second.id], 'deleted': []})
+        self.assertEqual(
+            delta['shopping_cart'],
+            {'added': [], 'deleted': [self.second.id]}
+        )
+
+    def test_related_changes_touch_recipes(self):
+        cursor = self.sync()['cursor']
+        self.user.first_name = 'Автор'
+        self.user.save()
+        self.assertEqual(
+            sorted(self.updated_ids(self.sync(cursor))),
+            sorted((self.first.id, self.second.id, self.third.id))
+        )
+
+    @mock.patch('recipes.sync.SYNC_PAGE_SIZE', 2)
+    def test_pages_split_equal_timestamps_by_id(self):
+        fourth = Recipe.objects.create(
+            author=self.user, name='Четвёртый', text='-', cooking_time=5)
+        # Как после миграции: у всех рецептов одна отметка updated_at.
+        Recipe.objects.update(
+            updated_at=timezone.now() - timedelta(minutes=1))
+
+        pages = [self.sync()]
+        while pages[-1]['has_more']:
+            pages.append(self.sync(pages[-1]['cursor']))
+        self.assertEqual(
+            [self.updated_ids(page) for page in pages],
+            [[self.first.id, self.second.id],
+             [self.third.id, fourth.id]]
+        )
+        self.assertEqual(
+            self.updated_ids(self.sync(pages[-1]['cursor'])), [])
+
+        # Старый курсор — просто отметка времени — тоже принимается.
+        self.third.save()
+        self.assertEqual(
+            self.updated_ids(self.sync(pages[1]['cursor'].split('_')[0])),
+            [self.third.id]
+        )
+
+    def test_expired_or_invalid_cursor(self):
+        expired = (timezone.now() - timedelta(days=365)).isoformat()
+        self.assertTrue(self.sync(expired)['reset'])
+        for cursor in ('вчера', '2026-01-01T00:00:00Z_abc'):
+            response = self.client.get(
+                reverse('recipes-sync'), {'updated_since': cursor})
+            self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_prune_tombstones(self):
+        self.third.delete()
+        Tombstone.objects.update(
+            deleted_at=timezone.now() - timedelta(days=365))
+        call_command('prune_tombstones', stdout=StringIO())
+        self.assertFalse(Tombstone.objects.exists())
+
+
+class SparseFieldsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass',
+            first_name='Автор', last_name='Рецептов')
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        self.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г')
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Суп', text='-', cooking_time=5)
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredients=self.ingredient, amount=10)
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        Subscription.objects.create(subscriber=self.user, author=self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, name, query, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name, kwargs=kwargs), query)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return response.json(), [query['sql'] for query in queries]
+
+    def test_values_fast_path(self):
+        data, queries = self.get(
+            'recipes-list', {'fields': 'id,name,is_favorited,author'})
+        self.assertEqual(data['results'], [{
+            'id': self.recipe.id,
+            'name': 'Суп',
+            'is_favorited': True,
+            'author': self.author.id,
+        }])
+        self.assertFalse(any(
+            'recipeingredient' in sql or 'users_user' in sql
+            for sql in queries
+        ))
+
+    def test_sparse_fragments_do_not_load_deferred_fields(self):
+        for number in range(9):
+            recipe = Recipe.objects.create(
+                author=self.author, name=f'Суп {number}', text='-',
+                cooking_time=5)
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredients=self.ingredient, amount=10)
+        counts = {}
+        for query in ({}, {'fields': 'id,ingredients'},
+                      {'fields': 'id,name', 'expand': 'author'}):
+            cache.clear()
+            data, queries = self.get('recipes-list', {**query, 'limit': 10})
+            self.assertEqual(len(data['results']), 10)
+            counts[tuple(query.values())] = len(queries)
+        # Холодный кэш фрагментов: число запросов не зависит от числа
+        # рецептов на странице.
+        self.assertLessEqual(max(counts.values()), counts[()] + 1, counts)
+
+    def test_expand_author(self):
+        data, queries = self.get(
+            'recipes-detail',
+            {'fields': 'id,ingredients', 'expand': 'author'},
+            pk=self.recipe.id,
+        )
+        self.assertEqual(set(data), {'id', 'ingredients', 'author'})
+        self.assertEqual(data['author']['id'], self.author.id)
+        self.assertTrue(data['author']['is_subscribed'])
+        self.assertEqual(data['ingredients'][0]['name'], 'Соль')
+
+    def test_all_fields_match_full_payload(self):
+        full, _ = self.get('recipes-detail', {}, pk=self.recipe.id)
+        sparse, _ = self.get(
+            'recipes-detail',
+            {'fields': ','.join(full), 'expand': 'author'},
+            pk=self.recipe.id,
+        )
+        self.assertEqual(sparse, full)
+        compact, _ = self.get(
+            'recipes-detail',
+            {'fields': 'id,image,image_renditions,is_in_shopping_cart'},
+            pk=self.recipe.id,
+        )
+        self.assertEqual(compact, {
+            name: full[name]
+            for name in ('id', 'image', 'image_renditions',
+                         'is_in_shopping_cart')
+        })
+
+    def test_unknown_fields_rejected(self):
+        for query in ({'fields': 'id,password'},
+                      {'fields': 'id', 'expand': 'name'}):
+            response = self.client.get(reverse('recipes-list'), query)
+            self.assertEqual(
+                response.status_code, HTTPStatus.BAD_REQUEST, query)
+
+    def test_subscriptions_sparse_fields(self):
+        data, _ = self.get(
+            'users-subscriptions', {'fields': 'id,recipes,recipes_count'})
+        self.assertEqual(data['results'], [{
+            'id': self.author.id,
+            'recipes': [self.recipe.id],
+            'recipes_count': 1,
+        }])
+        data, queries = self.get(
+            'users-subscriptions', {'fields': 'id,recipes_count'})
+        self.assertEqual(
+            data['results'], [{'id': self.author.id, 'recipes_count': 1}])
+        self.assertFalse(any('recipes_recipe"."name' in sql
+                             for sql in queries))
+
+
+class RenderingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='pass')
+        for number in range(3):
+            Recipe.objects.create(
+                author=self.user, name=f'Рецепт {number}',
+                text='Длинное описание рецепта. ' * 20, cooking_time=5)
+
+    def test_fast_renderer_matches_drf_output(self):
+        data = {
+            'name': 'Щи\u2028да каша',
+            'created': timezone.now(),
+            'price': Decimal('1.50'),
+            'label': lazy(lambda: 'Метка', str)(),
+            1: [None, True, 2.5],
+        }
+        self.assertEqual(
+            FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'))
+
+    def test_large_responses_are_gzipped(self):
+        url = reverse('recipes-list')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        response = self.client.get(
+            url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+        response = self.client.get(
+            reverse('recipes-list'), {'limit': 1, 'fields': 'id'},
+            HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(
+            username='user', email='user@example.com', password='pass')
+        Recipe.objects.create(
+            author=user, name='Рецепт', text='-', cooking_time=5)
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_queries_and_cache_are_recorded(self):
+        view = {'view': 'recipes-list'}
+        before = (
+            self.sample('http_requests_total', method='GET', status='200',
+                        **view),
+            self.sample('db_queries_per_request_sum', **view),
+            self.sample('cache_requests_total',
+                        cache='recipe_response', result='hit'),
+        )
+        for _ in range(2):
+            self.client.get(reverse('recipes-list'))
+        requests, queries, hits = (
+            self.sample('http_requests_total', method='GET', status='200',
+                        **view),
+            self.sample('db_queries_per_request_sum', **view),
+            self.sample('cache_requests_total',
+                        cache='recipe_response', result='hit'),
+        )
+        self.assertEqual(requests - before[0], 2)
+        self.assertGreater(queries - before[1], 0)
+        self.assertEqual(hits - before[2], 1)
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn(
+            b'http_request_duration_seconds_bucket{', response.content)
+
+    def test_async_requests_count_queries_from_worker_threads(self):
+        @sync_to_async(thread_sensitive=False)
+        def load_recipes():
+            return list(Recipe.objects.all())
+
+        async def get_response(request):
+            await load_recipes()
+            await load_recipes()
+            return HttpResponse()
+
+        middleware = MetricsMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        view = {'view': 'unresolved'}
+        before = self.sample('db_queries_per_request_sum', **view)
+        async_to_sync(middleware)(RequestFactory().get('/api/'))
+        self.assertEqual(
+            self.sample('db_queries_per_request_sum', **view) - before, 2)
+
+
+class ProfilingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='pass')
+        Recipe.objects.create(
+            author=self.user, name='Рецепт', text='-', cooking_time=5)
+
+    def test_staff_header_captures_cprofile(self):
+        client = APIClient()
+        token = Token.objects.create(user=self.staff)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        response = client.get(reverse('recipes-list'), HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        profile = RequestProfile.objects.get()
+        self.assertEqual(profile.mode, RequestProfile.CPROFILE)
+        self.assertEqual(profile.view_name, 'recipes-list')
+        self.assertEqual(profile.user, self.staff)
+        self.assertGreater(profile.sql_queries, 0)
+        self.assertGreater(profile.serializer_time, 0)
+        self.assertTrue(marshal.loads(bytes(profile.data)))
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse(
+            'admin:recipes_requestprofile_download', args=(profile.pk,)))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn(f'profile-{profile.pk}.prof',
+                      response['Content-Disposition'])
+        response = self.client.get(
+            reverse('admin:recipes_requestprofile_changelist'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_profiles_sync_views_under_asgi(self):
+        token = Token.objects.create(user=self.staff)
+        response = async_to_sync(AsyncClient().get)(
+            reverse('recipes-list'),
+            **{'authorization': f'Token {token}', 'x-profile': '1'},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        profile = RequestProfile.objects.get()
+        self.assertEqual(profile.user, self.staff)
+        self.assertGreater(profile.sql_queries, 0)
+        # cProfile запущен в том же потоке, что и представление.
+        self.assertGreater(profile.serializer_time, 0)
+
+    def test_header_ignored_for_other_users(self):
+        self.client.get(reverse('recipes-list'), HTTP_X_PROFILE='1')
+        self.client.force_login(self.user)
+        self.client.get(reverse('recipes-list'), HTTP_X_PROFILE='1')
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @mock.patch('backend.profiling.PROFILING_SAMPLE_RATE', 1)
+    @mock.patch(
+        'backend.profiling.PROFILING_SAMPLE_VIEWS',
+        frozenset(('recipes-list',)))
+    def test_sampled_requests_use_stack_sampler(self):
+        self.client.get(reverse('ingredients-list'))
+        self.client.get(reverse('recipes-list'))
+        profile = RequestProfile.objects.get()
+        self.assertEqual(profile.mode, RequestProfile.SAMPLE)
+        self.assertEqual(profile.view_name, 'recipes-list')
+        self.assertIsNone(profile.user)
+
+
+class IndexAdvisorTestCase(TestCase):
+    def setUp(self):
+        self.exports_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.exports_root, True)
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='pass')
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        Subscription.objects.create(subscriber=self.user, author=author)
+        ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г')
+        recipe = Recipe.objects.create(
+            author=author, name='Блины', text='-', cooking_time=20)
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredients=ingredient, amount=200)
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+
+    def suggestions(self, plan):
+        models_by_table = get_models(('recipes', 'users'))
+        return [
+            suggestion
+            for scan in find_seq_scans(plan)
+            for suggestion in classify(scan, models_by_table, {})[1]
+        ]
+
+    def test_command_replays_api_calls(self):
+        out = StringIO()
+        with mock.patch('api.exports.EXPORTS_ROOT', self.exports_root):
+            call_command('index_advisor', verbosity=2, stdout=out)
+        output = out.getvalue()
+        self.assertIn('GET /api/recipes/?is_favorited=1 [200]', output)
+        self.assertIn('GET /api/users/subscriptions/ [200]', output)
+        self.assertIn('GET /api/recipes/download_shopping_cart/ [200]', output)
+        self.assertNotRegex(output, r'GET \S+ \[(?!200)\d+\]')
+        self.assertIn('loops=1', output)
+
+    def test_filtered_seq_scan_without_index_is_suggested(self):
+        plan = {
+            'Node Type': 'Hash Join',
+            'Hash Cond': '(recipes_recipe.id = "U0".recipe_id)',
+            'Plans': [{
+                'Node Type': 'Seq Scan',
+                'Relation Name': 'recipes_recipe',
+                'Alias': 'recipes_recipe',
+                'Filter': "((name)::text = 'Борщ'::text)",
+                'Rows Removed by Filter': 10,
+            }, {
+                'Node Type': 'Hash',
+                'Plans': [{
+                    'Node Type': 'Seq Scan',
+                    'Relation Name': 'recipes_favorite',
+                    'Alias': 'U0',
+                }],
+            }],
+        }
+        self.assertEqual(self.suggestions(plan), [(Recipe, ('name',), None)])
+        migration = suggest_migrations(self.suggestions(plan))['recipes']
+        self.assertIn('migrations.AddIndex(', migration)
+        self.assertIn("name='recipe_name_idx'", migration)
+
+    def test_function_in_filter_needs_expression_index(self):
+        plan = {
+            'Node Type': 'Seq Scan',
+            'Relation Name': 'recipes_ingredient',
+            'Alias': 'recipes_ingredient',
+            'Filter': "(upper((name)::text) ~~ 'МУК%'::text)",
+        }
+        definition = 'upper((name)::text) text_pattern_ops'
+        self.assertEqual(self.suggestions(plan), [
+            (Ingredient, ('name',), ('upper', definition))])
+        migration = suggest_migrations(self.suggestions(plan))['recipes']
+        self.assertIn(
+            'CREATE INDEX ingredient_name_upper_idx ON recipes_ingredient '
+            f'({definition})', migration)
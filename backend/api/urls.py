@@ -16,6 +16,8 @@ Including another URLconf
 from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
+from backend.settings import ASYNC_API
+from . import async_views
 from .views import (
     UserSubscriptionViewSet,
     IngredientsViewSet,
@@ -40,6 +42,14 @@ router.register(
     basename='recipes'
 )
 
+async_urlpatterns = [
+    path('ingredients/', async_views.ingredient_list),
+    path('ingredients/<int:pk>/', async_views.ingredient_detail),
+    path('recipes/', async_views.recipe_list),
+    path('recipes/<int:pk>/', async_views.recipe_detail),
+    path('s/<str:key>/', async_views.short_link_redirect),
+]
+
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls')),
@@ -50,3 +60,6 @@ urlpatterns = [
         name='short-link-redirect'
     ),
 ]
+
+if ASYNC_API:
+    urlpatterns = async_urlpatterns + urlpatterns
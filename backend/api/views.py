@@ -1,44 +1,77 @@
-import os
 import secrets
 
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db.models import (
+    Count,
+    Exists,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Sum
+)
 from django.shortcuts import get_object_or_404, redirect
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
 from rest_framework import permissions, status
 from rest_framework.decorators import action
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
 
+from backend.settings import (
+    DEFAULT_PAGE_SIZE,
+    FEED_MAX_PAGE_SIZE,
+    MAX_SEARCH_INGREDIENTS,
+    RECOMMENDATION_TOP_K
+)
+from .mixins import AnonymousRecipeCacheMixin, SparseFieldsetMixin
 from .permissions import IsOwnerOrReadOnly
+from recipes.cache import get_ingredient_catalogue
+from recipes.feed import get_feed_recipe_ids
 from recipes.models import (
     Favorite,
     Ingredient,
     Recipe,
     RecipeIngredient,
+    RecipeSimilarity,
     ShoppingCart,
-    ShortLink
+    ShortLink,
+    UserRecommendation
+)
+from recipes.sync import (
+    get_collection_changes,
+    get_deleted_recipe_ids,
+    get_sync_page,
+    is_cursor_expired,
+    parse_cursor
 )
 from users.models import Subscription, User
 
-from .filters import IngredientsSearchFilter, RecipeFilterSet
+from .exports import export_response, export_shopping_cart
+from .filters import (
+    IngredientsSearchFilter,
+    RecipeByIngredientsFilterSet,
+    RecipeFilterSet
+)
 from .serializers import (
+    RECIPE_VALUE_COLUMNS,
+    RECIPE_VIEWER_FLAGS,
+    USER_VALUE_COLUMNS,
     CreateRecipeSerializer,
     FavoriteSerializer,
     IngredientsSerializer,
+    RecipeByIngredientsSerializer,
     RecipeSerializer,
     RecipeShortInfoSerializer,
     ShoppingCartSerializer,
     UserAvatarSerializer,
     UserSerializer,
-    UserSubscriptionsSerializer
+    UserSubscriptionsSerializer,
+    get_value_columns
 )
 
 
@@ -49,12 +82,62 @@ class IngredientsViewSet(RetrieveModelMixin, ListModelMixin, GenericViewSet):
     filter_backends = (IngredientsSearchFilter,)
     search_fields = ('^name',)
 
+    def list(self, request, *args, **kwargs):
+        if not request.query_params.get('name', '').strip():
+            return Response(get_ingredient_catalogue())
+        return super().list(request, *args, **kwargs)
+
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(SparseFieldsetMixin, AnonymousRecipeCacheMixin,
+                    ModelViewSet):
     queryset = Recipe.objects.all()
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilterSet
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields, expand = self.get_sparse_fields()
+        if fields is None or 'author' in expand:
+            queryset = queryset.select_related('author')
+        if fields is not None:
+            queryset = queryset.only('id', *get_value_columns(
+                RECIPE_VALUE_COLUMNS, fields - set(RECIPE_VIEWER_FLAGS)))
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        annotations = {
+            'is_favorited_by_me': Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            'is_in_my_shopping_cart': Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            'is_author_subscribed': Exists(Subscription.objects.filter(
+                subscriber=user, author=OuterRef('author'))),
+        }
+        if fields is not None:
+            needed = {
+                RECIPE_VALUE_COLUMNS[name] for name in RECIPE_VIEWER_FLAGS
+                if name in fields
+            }
+            if 'author' in expand:
+                needed.add('is_author_subscribed')
+            annotations = {
+                name: annotation for name, annotation in annotations.items()
+                if name in needed
+            }
+        return queryset.annotate(**annotations)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields, expand = self.get_sparse_fields()
+        if fields is None or expand or not fields <= set(RECIPE_VALUE_COLUMNS):
+            return queryset
+        # Частые узкие выборки сериализуются прямо из словарей .values().
+        columns = get_value_columns(RECIPE_VALUE_COLUMNS, fields) | {'id'}
+        missing_flags = {
+            RECIPE_VALUE_COLUMNS[name] for name in RECIPE_VIEWER_FLAGS
+        } - set(queryset.query.annotations)
+        return queryset.values(*(columns - missing_flags))
+
     def get_permissions(self):
         if self.action == 'create':
             return (permissions.IsAuthenticated(),)
@@ -142,37 +225,178 @@ class RecipeViewSet(ModelViewSet):
             RecipeIngredient.objects.filter(recipe__shopping_cart__user=user)
             .values('ingredients__name', 'ingredients__measurement_unit')
             .annotate(total_amount=Sum('amount'))
+            .order_by('ingredients__name')
         )
 
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = (
-            "attachment; "
-            "filename='shopping_cart.pdf'"
+        return export_response(
+            export_shopping_cart(ingredients),
+            'shopping_cart.pdf',
+            'application/pdf',
         )
 
-        font_path = os.path.join(
-            os.path.dirname(os.path.abspath(__file__)), 'font/', 'Roboto.ttf'
+    @action(
+        detail=False,
+        methods=('get',),
+        url_path='by-ingredients',
+        url_name='by-ingredients',
+        filterset_class=RecipeByIngredientsFilterSet,
+    )
+    def by_ingredients(self, request):
+        raw_ids = request.query_params.get('ingredients', '')
+        try:
+            ingredient_ids = {
+                int(pk) for pk in raw_ids.split(',') if pk.strip()
+            }
+        except ValueError:
+            return Response(
+                {'ingredients': 'Ожидается список id ингредиентов.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not ingredient_ids:
+            return Response(
+                {'ingredients': 'Необходимо указать хотя бы один ингредиент.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(ingredient_ids) > MAX_SEARCH_INGREDIENTS:
+            return Response(
+                {'ingredients': (
+                    'Можно указать не больше '
+                    f'{MAX_SEARCH_INGREDIENTS} ингредиентов.'
+                )},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        total_ingredients = (
+            RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+            .order_by()
+            .values('recipe')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        queryset = (
+            self.filter_queryset(self.get_queryset())
+            .filter(recipes_ingredient__ingredients__in=ingredient_ids)
+            .annotate(matched=Count('recipes_ingredient'))
+            .annotate(missing=ExpressionWrapper(
+                Subquery(total_ingredients) - F('matched'),
+                output_field=IntegerField(),
+            ))
+            .order_by('-matched', 'missing', '-id')
         )
-        pdfmetrics.registerFont(TTFont('Roboto', font_path))
 
-        pdf = canvas.Canvas(response, pagesize=letter)
-        pdf.setFont('Roboto', 14)
-        pdf.drawString(210, 820, 'Корзина покупок:')
+        page = self.paginate_queryset(queryset)
+        serializer = RecipeByIngredientsSerializer(
+            page, many=True, context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=('get',),
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def feed(self, request):
+        try:
+            limit = int(request.query_params.get('limit', DEFAULT_PAGE_SIZE))
+            before = request.query_params.get('before')
+            before = int(before) if before else None
+        except ValueError:
+            return Response(
+                {'detail': 'Параметры limit и before должны быть числами.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = min(max(limit, 1), FEED_MAX_PAGE_SIZE)
+
+        recipe_ids = get_feed_recipe_ids(request.user, limit, before)
+        next_url = None
+        if len(recipe_ids) == limit:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), 'before', recipe_ids[-1])
+        return Response({
+            'next': next_url,
+            'results': self._serialize_in_order(recipe_ids),
+        })
 
-        y_position = 750
-        pdf.setFont('Roboto', 12)
+    @action(detail=True, methods=('get',))
+    def similar(self, request, pk=None):
+        recipe_ids = list(
+            RecipeSimilarity.objects.filter(recipe_id=pk)
+            .order_by('-score')
+            .values_list('similar_id', flat=True)[:RECOMMENDATION_TOP_K]
+        )
+        if not recipe_ids:
+            get_object_or_404(Recipe, pk=pk)
+        return Response(self._serialize_in_order(recipe_ids))
 
-        for item in ingredients:
-            name = item['ingredients__name']
-            unit = item['ingredients__measurement_unit']
-            amount = item['total_amount']
-            pdf.drawString(70, y_position, f'{name} ({unit}) — {amount}')
-            y_position -= 15
+    @action(
+        detail=False,
+        methods=('get',),
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def recommended(self, request):
+        recipe_ids = list(
+            UserRecommendation.objects.filter(user=request.user)
+            .order_by('-score')
+            .values_list('recipe_id', flat=True)[:RECOMMENDATION_TOP_K]
+        )
+        return Response(self._serialize_in_order(recipe_ids))
 
-        pdf.showPage()
-        pdf.save()
+    @action(detail=False, methods=('get',))
+    def trending(self, request):
+        queryset = self.get_queryset().filter(
+            trending__isnull=False
+        ).order_by('-trending__score', '-id')
+        page = self.paginate_queryset(queryset)
+        serializer = RecipeSerializer(
+            page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
 
-        return response
+    @action(detail=False, methods=('get',))
+    def sync(self, request):
+        since = since_id = None
+        cursor = request.query_params.get('updated_since')
+        if cursor:
+            try:
+                since, since_id = parse_cursor(cursor)
+            except ValueError:
+                return Response(
+                    {'detail': 'Параметр updated_since должен быть курсором '
+                               'из предыдущего ответа или датой в формате '
+                               'ISO 8601.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        # Без курсора или с курсором старше хранимых удалений клиент
+        # должен заменить свои данные полным снимком.
+        reset = since is None or is_cursor_expired(since)
+        if reset:
+            since = since_id = None
+
+        recipe_ids, until, cursor, has_more = get_sync_page(since, since_id)
+        recipes = self.get_queryset().filter(pk__in=recipe_ids).order_by(
+            'updated_at', 'id')
+        data = {
+            'cursor': cursor,
+            'has_more': has_more,
+            'reset': reset,
+            'recipes': {
+                'updated': RecipeSerializer(
+                    recipes, many=True,
+                    context=self.get_serializer_context()
+                ).data,
+                'deleted': get_deleted_recipe_ids(since, until),
+            },
+        }
+        if request.user.is_authenticated:
+            data.update(get_collection_changes(request.user, since, until))
+        return Response(data)
+
+    def _serialize_in_order(self, recipe_ids):
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        return RecipeSerializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes],
+            many=True,
+            context=self.get_serializer_context(),
+        ).data
 
     @action(
         detail=True,
@@ -197,9 +421,20 @@ class RecipeViewSet(ModelViewSet):
         })
 
 
-class UserSubscriptionViewSet(UserViewSet):
+class UserSubscriptionViewSet(SparseFieldsetMixin, UserViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    sparse_actions = ('list', 'retrieve', 'subscriptions')
+
+    def get_queryset(self):
+        return self._only_requested(super().get_queryset())
+
+    def _only_requested(self, queryset):
+        fields, _ = self.get_sparse_fields()
+        if fields is None:
+            return queryset
+        return queryset.only(
+            'id', *get_value_columns(USER_VALUE_COLUMNS, fields))
 
     def get_permissions(self):
         if self.action in ('retrieve', 'list'):
@@ -276,8 +511,8 @@ class UserSubscriptionViewSet(UserViewSet):
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         if request.method == 'DELETE':
-            if user.avatar:
-                user.avatar.delete(save=False)
+            # Тот же файл может быть у других пользователей и рецептов,
+            # его удалит collect_media_garbage.
             user.avatar = None
             user.save()
             return Response(status=status.HTTP_204_NO_CONTENT)
@@ -289,8 +524,17 @@ class UserSubscriptionViewSet(UserViewSet):
         serializer_class=UserSubscriptionsSerializer,
     )
     def subscriptions(self, request):
-        queryset = User.objects.filter(
-            author__subscriber=request.user) .prefetch_related('recipes')
+        fields, expand = self.get_sparse_fields()
+        queryset = self._only_requested(
+            User.objects.filter(author__subscriber=request.user))
+        if fields is None or 'recipes' in expand:
+            queryset = queryset.prefetch_related('recipes')
+        elif 'recipes' in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipes', queryset=Recipe.objects.only('id', 'author')))
+        elif 'recipes_count' in fields:
+            queryset = queryset.annotate(
+                recipes_total=Count('recipes', distinct=True))
 
         page = self.paginate_queryset(queryset)
         serializer = self.get_serializer(page, many=True)
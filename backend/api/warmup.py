@@ -0,0 +1,17 @@
+from django.db import connections
+from django.urls import get_resolver
+
+from recipes.cache import get_ingredient_catalogue
+
+from .exports import register_fonts
+
+
+def warm_up():
+    # Вызывается в мастер-процессе gunicorn до форка: воркеры получают
+    # загруженные модули, шрифты и каталог ингредиентов через
+    # copy-on-write. Соединения с БД закрываются, чтобы воркеры не
+    # делили один сокет.
+    get_resolver().url_patterns
+    register_fonts()
+    get_ingredient_catalogue()
+    connections.close_all()
@@ -0,0 +1,16 @@
+from django.middleware import gzip
+
+from backend.settings import GZIP_MIN_LENGTH, GZIP_SKIP_CONTENT_TYPES
+
+
+class GZipMiddleware(gzip.GZipMiddleware):
+    # Маленькие ответы и уже сжатые форматы отдаются как есть: выигрыш
+    # в байтах меньше затрат на сжатие.
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < GZIP_MIN_LENGTH:
+            return response
+        if response.get('Content-Type', '').startswith(
+                GZIP_SKIP_CONTENT_TYPES):
+            return response
+        return super().process_response(request, response)
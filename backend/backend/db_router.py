@@ -0,0 +1,143 @@
+import asyncio
+import random
+import time
+from contextvars import ContextVar
+
+from django.db import DatabaseError, connections
+
+from backend.settings import (
+    REPLICA_DATABASES,
+    REPLICA_LAG_CHECK_INTERVAL,
+    REPLICA_MAX_LAG,
+    REPLICA_STICKY_SECONDS
+)
+
+PRIMARY_DATABASE = 'default'
+PRIMARY_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Пока реплика догоняет мастер, pg_last_xact_replay_timestamp() не
+# меняется, поэтому при совпадении LSN отставание считается нулевым.
+REPLICA_LAG_SQL = '''
+SELECT CASE
+    WHEN NOT pg_is_in_recovery()
+        OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END
+'''
+
+_routing = ContextVar('db_routing', default=None)
+_replica_lag = {}
+
+
+class RoutingState:
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.replica = None
+        self.wrote = False
+
+
+def get_replica_lag(alias):
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(REPLICA_LAG_SQL)
+        return float(cursor.fetchone()[0] or 0)
+
+
+def is_replica_available(alias):
+    checked_at, lag = _replica_lag.get(alias, (None, None))
+    now = time.monotonic()
+    if checked_at is None or now - checked_at > REPLICA_LAG_CHECK_INTERVAL:
+        try:
+            lag = get_replica_lag(alias)
+        except DatabaseError:
+            lag = None
+        _replica_lag[alias] = (now, lag)
+    return lag is not None and lag <= REPLICA_MAX_LAG
+
+
+def choose_replica():
+    replicas = [
+        alias for alias in REPLICA_DATABASES if is_replica_available(alias)
+    ]
+    return random.choice(replicas) if replicas else PRIMARY_DATABASE
+
+
+class ReplicaRouter:
+    # Вне запроса (команды, воркеры) и после любой записи в рамках
+    # запроса все чтения идут в основную базу.
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or not state.use_replica or state.wrote:
+            return PRIMARY_DATABASE
+        if state.replica is None:
+            state.replica = choose_replica()
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_DATABASE
+
+
+class ReplicaRoutingMiddleware:
+    # После записи клиент какое-то время читает из основной базы, чтобы
+    # видеть свои изменения, пока реплики их не получили.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Под ASGI обработчик вызывается как корутина и запрос не
+            # занимает поток на всё время выполнения.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        state, token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self._finish(state, response)
+
+    async def __acall__(self, request):
+        # sync_to_async копирует контекст, поэтому состояние видно и в
+        # потоках, где выполняются запросы к базе.
+        state, token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self._finish(state, response)
+
+    def _start(self, request):
+        state = RoutingState(
+            use_replica=bool(REPLICA_DATABASES)
+            and request.method in SAFE_METHODS
+            and PRIMARY_COOKIE not in request.COOKIES
+        )
+        return state, _routing.set(state)
+
+    def _finish(self, state, response):
+        if state.wrote:
+            response.set_cookie(
+                PRIMARY_COOKIE,
+                '1',
+                max_age=REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,310 @@
+import json
+import re
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, migrations, models, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+SEQ_SCAN = 'Seq Scan'
+JOIN_CONDITIONS = ('Hash Cond', 'Merge Cond', 'Join Filter')
+STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+CAST_RE = re.compile(
+    r'::(?:character varying|double precision'
+    r'|timestamp with(?:out)? time zone|\w+)(?:\[\])?')
+QUALIFIED_RE = re.compile(r'\b(\w+)\.(\w+)\b')
+# Столбец внутри функции, например upper((name)::text) ~~ 'МУК%'.
+EXPRESSION_RE = re.compile(
+    r'\b(?P<function>\w+)\(\(*(?:(?P<table>\w+)\.)?(?P<column>\w+)\)*'
+    r'(?P<cast>::[\w ]+?)?\)\s*(?P<operator>~~\*?|[<>=]+)?')
+LIKE = '~~'
+IDENTIFIER_RE = re.compile(r'\b[a-z_]\w*\b')
+# Каждый вызов идёт с пустым локальным кэшем, иначе не будет видно
+# запросов, ответы на которые уже лежат в общем кэше.
+ADVISOR_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'index-advisor',
+}}
+
+
+class QueryRecorder:
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if not many and sql.lstrip().upper().startswith('SELECT'):
+                self.queries.append({
+                    'alias': context['connection'].alias,
+                    'sql': sql,
+                    'params': params,
+                    'duration': time.perf_counter() - started,
+                })
+
+
+def get_scenarios(user=None):
+    from recipes.models import Recipe, RecipeIngredient
+    from users.models import User
+
+    if user is None:
+        user = User.objects.annotate(
+            cart=Count('shopping_cart')).order_by('-cart', 'pk').first()
+    recipe = Recipe.objects.order_by('-pk').first()
+    item = RecipeIngredient.objects.select_related('ingredients').order_by(
+        '-recipe_id').first()
+    recipes = reverse('recipes-list')
+    scenarios = [(recipes, {}, False)]
+    if recipe is not None:
+        word = recipe.name.split()[0] if recipe.name.split() else ''
+        scenarios += [
+            (recipes, {'author': recipe.author_id}, False),
+            (recipes, {'search': word}, False),
+            (recipes, {'min_cooking_time': 1,
+                       'max_cooking_time': recipe.cooking_time}, False),
+            (reverse('recipes-detail', args=(recipe.pk,)), {}, False),
+            (recipes, {'is_favorited': 1}, True),
+            (recipes, {'is_in_shopping_cart': 1}, True),
+            (reverse('recipes-feed'), {}, True),
+        ]
+    if item is not None:
+        scenarios += [
+            (recipes, {'ingredients': item.ingredients_id}, False),
+            (recipes, {'exclude_ingredients': item.ingredients_id}, False),
+            (reverse('recipes-by-ingredients'),
+             {'ingredients': item.ingredients_id}, False),
+            (reverse('ingredients-list'),
+             {'name': item.ingredients.name[:3]}, False),
+        ]
+    scenarios += [
+        (reverse('users-subscriptions'), {}, True),
+        (reverse('recipes-download-shopping-cart'), {}, True),
+    ]
+    return user, [
+        (path, params, authenticated)
+        for path, params, authenticated in scenarios
+        if user is not None or not authenticated
+    ]
+
+
+def replay(user, path, params, authenticated):
+    host = settings.ALLOWED_HOSTS[0].lstrip('.')
+    client = APIClient(HTTP_HOST='localhost' if host == '*' else host)
+    if authenticated:
+        client.force_authenticate(user)
+    recorder = QueryRecorder()
+    with override_settings(CACHES=ADVISOR_CACHES), ExitStack() as stack:
+        cache.clear()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        response = client.get(path, params)
+        # Ленивые ответы (PDF, потоковые файлы) читают базу при отдаче.
+        if response.streaming:
+            b''.join(response.streaming_content)
+    return response.status_code, recorder.queries
+
+
+def explain(query):
+    # EXPLAIN ANALYZE выполняет запрос, поэтому он идёт в транзакции,
+    # которая всегда откатывается.
+    alias = query['alias']
+    with transaction.atomic(using=alias):
+        with connections[alias].cursor() as cursor:
+            cursor.execute(
+                f'EXPLAIN (ANALYZE, FORMAT JSON) {query["sql"]}',
+                query['params'],
+            )
+            plan = cursor.fetchone()[0]
+        transaction.set_rollback(True, using=alias)
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+def _condition_columns(condition, alias, qualified_only):
+    condition = STRING_LITERAL_RE.sub('', condition.replace('"', ''))
+    expressions = []
+    if not qualified_only:
+        for match in EXPRESSION_RE.finditer(condition):
+            if match['table'] not in (None, alias):
+                continue
+            # Обычный индекс по столбцу такие условия не использует, а для
+            # LIKE по префиксу нужен ещё класс операторов text_pattern_ops.
+            expressions.append({
+                'column': match['column'],
+                'function': match['function'].lower(),
+                'index': (
+                    f'{match["function"]}(({match["column"]})'
+                    f'{match["cast"] or ""})'
+                    + (' text_pattern_ops'
+                       if match['operator'] == LIKE else '')
+                ),
+            })
+        condition = EXPRESSION_RE.sub('', condition)
+    condition = CAST_RE.sub('', condition)
+    columns = [
+        column for table, column in QUALIFIED_RE.findall(condition)
+        if table == alias
+    ]
+    if not qualified_only:
+        # Неквалифицированные имена в Filter относятся к самому сканируемому
+        # отношению; ссылки на другие таблицы вычищаются.
+        columns += IDENTIFIER_RE.findall(QUALIFIED_RE.sub(
+            lambda match: match[2] if match[1] == alias else '', condition))
+    return columns, expressions
+
+
+def find_seq_scans(node, ancestors=()):
+    if node.get('Node Type') == SEQ_SCAN:
+        alias = node.get('Alias', node['Relation Name'])
+        columns, expressions = _condition_columns(
+            node.get('Filter', ''), alias, False)
+        join_columns = [
+            column
+            for ancestor in ancestors for key in JOIN_CONDITIONS
+            for column in _condition_columns(
+                ancestor.get(key, ''), alias, True)[0]
+        ]
+        loops = node.get('Actual Loops', 1)
+        yield {
+            'table': node['Relation Name'],
+            # Без своего фильтра строки отбирает условие соединения.
+            'columns': list(dict.fromkeys(columns or join_columns)),
+            'expressions': expressions,
+            'rows': node.get('Actual Rows', 0) * loops,
+            'rows_removed': node.get('Rows Removed by Filter', 0) * loops,
+            'time': node.get('Actual Total Time', 0.0) * loops,
+        }
+    for child in node.get('Plans', ()):
+        yield from find_seq_scans(child, (*ancestors, node))
+
+
+def format_plan(node, depth=0):
+    relation = node.get('Relation Name')
+    label = node['Node Type'] + (f' on {relation}' if relation else '')
+    details = [
+        f'{key}: {node[key]}'
+        for key in ('Index Name', 'Filter', 'Index Cond', *JOIN_CONDITIONS)
+        if key in node
+    ]
+    yield (
+        f'{"  " * depth}{label}  rows={node.get("Actual Rows")} '
+        f'loops={node.get("Actual Loops")} '
+        f'time={node.get("Actual Total Time")} ms'
+        + ''.join(f'\n{"  " * depth}  {detail}' for detail in details)
+    )
+    for child in node.get('Plans', ()):
+        yield from format_plan(child, depth + 1)
+
+
+def get_models(app_labels):
+    return {
+        model._meta.db_table: model
+        for model in apps.get_models()
+        if model._meta.app_label in app_labels
+    }
+
+
+def get_indexes(table):
+    connection = connections['default']
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+        cursor.execute(
+            'SELECT indexdef FROM pg_indexes WHERE tablename = %s', [table])
+        definitions = [row[0] for row in cursor.fetchall()]
+    leading_columns = {
+        constraint['columns'][0]
+        for constraint in constraints.values()
+        if constraint['columns'] and constraint['columns'][0] and (
+            constraint['index'] or constraint['unique']
+            or constraint['primary_key'])
+    }
+    return leading_columns, definitions
+
+
+def classify(scan, models_by_table, indexes):
+    # Поля модели из условий seq scan и индексы, которых для них не
+    # хватает. Если индекс есть, seq scan выбран планировщиком (например,
+    # на маленькой таблице), и новый индекс не поможет.
+    table = scan['table']
+    model = models_by_table[table]
+    fields = {
+        field.column: field.name for field in model._meta.concrete_fields}
+    columns = [column for column in scan['columns'] if column in fields]
+    expressions = [
+        expression for expression in scan['expressions']
+        if expression['column'] in fields
+    ]
+    if not columns and not expressions:
+        return (), []
+    if table not in indexes:
+        indexes[table] = get_indexes(table)
+    leading_columns, definitions = indexes[table]
+    missing = []
+    if columns and not leading_columns & set(columns):
+        missing.append(
+            (model, tuple(fields[column] for column in columns), None))
+    for expression in expressions:
+        if not any(expression['index'] in line for line in definitions):
+            missing.append((
+                model,
+                (fields[expression['column']],),
+                (expression['function'], expression['index']),
+            ))
+    found = tuple(dict.fromkeys(
+        fields[column] for column in columns
+        + [expression['column'] for expression in expressions]
+    ))
+    return found, missing
+
+
+def describe(model, fields, expression):
+    if expression is not None:
+        return f'{model._meta.label}({expression[1]})'
+    return f'{model._meta.label}({", ".join(fields)})'
+
+
+def _index_name(model, fields, suffix='idx'):
+    return f'{model._meta.model_name}_{"_".join(fields)}_{suffix}'
+
+
+def suggest_migrations(suggestions):
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    operations = defaultdict(list)
+    for model, fields, expression in suggestions:
+        if expression is not None:
+            # Выражение с классом операторов в Index Django 3.2 не описать.
+            function, definition = expression
+            name = _index_name(model, fields, f'{function}_idx')
+            operation = migrations.RunSQL(
+                f'CREATE INDEX {name} ON {model._meta.db_table} '
+                f'({definition});',
+                f'DROP INDEX {name};',
+            )
+        else:
+            index = models.Index(
+                fields=fields, name=_index_name(model, fields))
+            if len(index.name) > index.max_name_length:
+                index.set_name_with_model(model)
+            operation = migrations.AddIndex(
+                model_name=model._meta.model_name, index=index)
+        operations[model._meta.app_label].append(operation)
+    sources = {}
+    for app_label, app_operations in operations.items():
+        migration = migrations.Migration('index_advisor', app_label)
+        migration.dependencies = loader.graph.leaf_nodes(app_label)
+        migration.operations = app_operations
+        sources[app_label] = MigrationWriter(migration).as_string()
+    return sources
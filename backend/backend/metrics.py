@@ -0,0 +1,161 @@
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+
+# Без PROMETHEUS_MULTIPROC_DIR метрики живут в памяти процесса; под
+# gunicorn каталог задаётся в gunicorn.conf.py и воркеры пишут в свои файлы.
+MULTIPROCESS = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE'))
+
+_query_counters = ContextVar('query_counters', default=())
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Request latency by view',
+    ('view', 'method'),
+)
+REQUESTS = Counter(
+    'http_requests',
+    'Responses by view and status code',
+    ('view', 'method', 'status'),
+)
+DB_QUERIES = Histogram(
+    'db_queries_per_request',
+    'Database queries per request',
+    ('view',),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200),
+)
+DB_QUERY_TIME = Histogram(
+    'db_query_duration_seconds_per_request',
+    'Total database time per request',
+    ('view',),
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests',
+    'Cache lookups by cache and result',
+    ('cache', 'result'),
+)
+PDF_RENDER_TIME = Histogram(
+    'pdf_render_duration_seconds',
+    'Shopping cart PDF render time',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+IMAGE_UPLOAD_SIZE = Histogram(
+    'image_upload_bytes',
+    'Size of uploaded images',
+    ('field',),
+    buckets=tuple(2 ** power * 1024 for power in range(4, 15)),
+)
+
+
+def record_cache(name, hits, misses=0):
+    if hits:
+        CACHE_REQUESTS.labels(name, 'hit').inc(hits)
+    if misses:
+        CACHE_REQUESTS.labels(name, 'miss').inc(misses)
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+def _count_query(execute, sql, params, many, context):
+    counters = _query_counters.get()
+    if not counters:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        for counter in counters:
+            counter.count += 1
+            counter.duration += duration
+
+
+def install_query_counter(connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+# Соединения живут в своих потоках (под ASGI ORM работает в потоках
+# sync_to_async), поэтому обёртка ставится на каждое новое соединение,
+# а счётчики запроса передаются через контекст.
+connection_created.connect(install_query_counter)
+
+
+@contextmanager
+def count_queries():
+    for connection in connections.all():
+        install_query_counter(connection)
+    queries = QueryCounter()
+    token = _query_counters.set((*_query_counters.get(), queries))
+    try:
+        yield queries
+    finally:
+        _query_counters.reset(token)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with count_queries() as queries:
+            response = self.get_response(request)
+        self._observe(request, response, queries, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with count_queries() as queries:
+            response = await self.get_response(request)
+        self._observe(request, response, queries, started)
+        return response
+
+    def _observe(self, request, response, queries, started):
+        duration = time.perf_counter() - started
+        # Имя маршрута, а не путь, чтобы число рядов метрик не росло
+        # вместе с числом рецептов.
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        method = request.method if request.method in METHODS else 'other'
+        REQUEST_LATENCY.labels(view, method).observe(duration)
+        REQUESTS.labels(view, method, response.status_code).inc()
+        DB_QUERIES.labels(view).observe(queries.count)
+        DB_QUERY_TIME.labels(view).observe(queries.duration)
+
+
+def metrics_view(request):
+    registry = REGISTRY
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(
+        generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
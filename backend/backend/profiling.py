@@ -0,0 +1,273 @@
+import asyncio
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from backend.metrics import count_queries
+from backend.settings import (
+    PROFILING_ENABLED,
+    PROFILING_KEEP,
+    PROFILING_SAMPLE_INTERVAL,
+    PROFILING_SAMPLE_RATE,
+    PROFILING_SAMPLE_VIEWS,
+    PROFILING_SUMMARY_LINES
+)
+from recipes.models import RequestProfile
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+SERIALIZER_FILE = os.path.join('rest_framework', 'serializers.py')
+# В Python 3.12 cProfile один на интерпретатор, поэтому воркер
+# профилирует не больше одного запроса одновременно.
+_profiling = threading.Lock()
+
+
+def is_serializer_frame(filename, name):
+    # Все .data сериализаторов DRF проходят через BaseSerializer.data.
+    return name == 'data' and filename.endswith(SERIALIZER_FILE)
+
+
+def frame_label(filename, name):
+    return f'{os.path.join(*filename.split(os.sep)[-2:])}:{name}'
+
+
+class CProfileCollector:
+    mode = RequestProfile.CPROFILE
+    extension = 'prof'
+
+    def start(self):
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        self.stats = pstats.Stats(self.profile)
+
+    def serializer_time(self):
+        return max((
+            cumulative
+            for (filename, _, name), (_, _, _, cumulative, _)
+            in self.stats.stats.items()
+            if is_serializer_frame(filename, name)
+        ), default=0.0)
+
+    def summary(self):
+        self.stats.stream = io.StringIO()
+        self.stats.sort_stats('cumulative').print_stats(
+            PROFILING_SUMMARY_LINES)
+        return self.stats.stream.getvalue()
+
+    def dump(self):
+        # Формат pstats: файл открывается pstats.Stats или snakeviz.
+        return marshal.dumps(self.stats.stats)
+
+
+class StackSampler:
+    mode = RequestProfile.SAMPLE
+    extension = 'txt'
+
+    def start(self):
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+
+    def _sample(self):
+        while not self.stopped.wait(PROFILING_SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append((frame.f_code.co_filename, frame.f_code.co_name))
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def serializer_time(self):
+        return PROFILING_SAMPLE_INTERVAL * sum(
+            count for stack, count in self.stacks.items()
+            if any(is_serializer_frame(*frame) for frame in stack)
+        )
+
+    def summary(self):
+        totals = Counter()
+        for stack, count in self.stacks.items():
+            for frame in set(stack):
+                totals[frame] += count
+        return '\n'.join(
+            f'{count * PROFILING_SAMPLE_INTERVAL:8.3f} s  '
+            f'{frame_label(*frame)}'
+            for frame, count in totals.most_common(PROFILING_SUMMARY_LINES)
+        )
+
+    def dump(self):
+        # Свёрнутые стеки: формат flamegraph.pl и speedscope.
+        return '\n'.join(
+            f'{";".join(frame_label(*frame) for frame in stack)} {count}'
+            for stack, count in self.stacks.most_common()
+        ).encode()
+
+
+COLLECTORS = {
+    collector.mode: collector
+    for collector in (CProfileCollector, StackSampler)
+}
+
+
+class ActiveProfile:
+
+    def __init__(self, collector, in_thread):
+        self.collector = collector
+        # Синхронное представление под ASGI выполняется в потоке
+        # sync_to_async, и профилировщик должен работать в том же потоке.
+        self.in_thread = in_thread
+        self.stack = ExitStack()
+        self.queries = self.stack.enter_context(count_queries())
+        self.started = time.perf_counter()
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+        self.stack.close()
+
+
+class ProfilingMiddleware:
+    # Профилируется только то, что выбрано заголовком X-Profile
+    # (cprofile или sample) от сотрудника или случайной выборкой;
+    # остальные запросы не платят ничего, кроме проверки заголовка.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+            # Django берёт process_view у экземпляра. Синхронный метод под
+            # ASGI отправлял бы в поток каждый запрос, а не только
+            # профилируемые.
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        profile = getattr(request, '_profiling', None)
+        if profile is not None:
+            try:
+                profile.collector.stop()
+                profile.finish()
+                self._save(request, response, profile)
+            finally:
+                _profiling.release()
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        profile = getattr(request, '_profiling', None)
+        if profile is not None:
+            try:
+                if profile.in_thread:
+                    await sync_to_async(profile.collector.stop)()
+                else:
+                    profile.collector.stop()
+                profile.finish()
+                await sync_to_async(self._save)(request, response, profile)
+            finally:
+                _profiling.release()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = self._begin(request, self._get_mode(request), False)
+        if profile is not None:
+            profile.collector.start()
+        return None
+
+    async def _aprocess_view(self, request, view_func, view_args,
+                             view_kwargs):
+        if PROFILE_HEADER in request.META:
+            # Проверка сотрудника читает сессию или токен из базы.
+            mode = await sync_to_async(self._get_mode)(request)
+        else:
+            mode = self._get_sampled_mode(request)
+        profile = self._begin(
+            request, mode, not asyncio.iscoroutinefunction(view_func))
+        if profile is None:
+            return None
+        if profile.in_thread:
+            await sync_to_async(profile.collector.start)()
+        else:
+            profile.collector.start()
+        return None
+
+    def _begin(self, request, mode, in_thread):
+        if mode is None or not _profiling.acquire(blocking=False):
+            return None
+        request._profiling = ActiveProfile(COLLECTORS[mode](), in_thread)
+        return request._profiling
+
+    def _get_mode(self, request):
+        header = request.META.get(PROFILE_HEADER)
+        if header is None:
+            return self._get_sampled_mode(request)
+        if not self._is_staff(request):
+            return None
+        if header == RequestProfile.SAMPLE:
+            return RequestProfile.SAMPLE
+        return RequestProfile.CPROFILE
+
+    def _get_sampled_mode(self, request):
+        if (PROFILING_SAMPLE_RATE
+                and (not PROFILING_SAMPLE_VIEWS
+                     or request.resolver_match.view_name
+                     in PROFILING_SAMPLE_VIEWS)
+                and random.random() < PROFILING_SAMPLE_RATE):
+            return RequestProfile.SAMPLE
+        return None
+
+    def _is_staff(self, request):
+        if request.user.is_authenticated:
+            return request.user.is_staff
+        # Токен API проверяется здесь же: DRF аутентифицирует запрос
+        # только внутри представления.
+        try:
+            authenticated = TokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return authenticated is not None and authenticated[0].is_staff
+
+    def _save(self, request, response, profile):
+        collector = profile.collector
+        user = request.user
+        RequestProfile.objects.create(
+            user=user if user.is_authenticated else None,
+            method=request.method,
+            path=request.get_full_path()[:255],
+            view_name=request.resolver_match.view_name,
+            status_code=response.status_code,
+            mode=collector.mode,
+            duration=profile.duration,
+            sql_queries=profile.queries.count,
+            sql_time=profile.queries.duration,
+            serializer_time=collector.serializer_time(),
+            summary=collector.summary(),
+            data=collector.dump(),
+        )
+        stale = RequestProfile.objects.values_list(
+            'pk', flat=True)[PROFILING_KEEP:]
+        RequestProfile.objects.filter(pk__in=list(stale)).delete()
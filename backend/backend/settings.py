@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'django_filters',
@@ -45,6 +46,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.metrics.MetricsMiddleware',
+    'backend.profiling.ProfilingMiddleware',
+    'backend.db_router.ReplicaRoutingMiddleware',
+    'backend.compression.GZipMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,6 +59,12 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if os.getenv('GZIP_RESPONSES', 'True') != 'True':
+    MIDDLEWARE.remove('backend.compression.GZipMiddleware')
+
+GZIP_MIN_LENGTH = int(os.getenv('GZIP_MIN_LENGTH', 1024))
+GZIP_SKIP_CONTENT_TYPES = ('image/', 'application/pdf', 'application/zip')
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -90,6 +101,34 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: DB_REPLICA_HOSTS=host1,host2:5433
+REPLICA_DATABASES = []
+for index, address in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))):
+    host, _, port = address.strip().partition(':')
+    alias = f'replica{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['backend.db_router.ReplicaRouter']
+REPLICA_MAX_LAG = 5
+REPLICA_LAG_CHECK_INTERVAL = 2
+REPLICA_STICKY_SECONDS = 10
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 AUTH_USER_MODEL = 'users.User'
 
 # Password validation
@@ -112,6 +151,10 @@ AUTH_PASSWORD_VALIDATORS = [
 
 DEBUG = os.getenv('DEBUG', 'False') == 'True'
 
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+BOOTSTRAP_LOCK_ID = 8_214_530
+ASYNC_API = SERVER_MODE == 'asgi'
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
 
@@ -133,6 +176,7 @@ STATIC_URL = '/static/'
 STATIC_ROOT = '/backend_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/app/media'
+DEFAULT_FILE_STORAGE = 'backend.storage.ContentAddressedStorage'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
@@ -153,6 +197,69 @@ MIN_INGREDIENTS_COUNT = 1
 REGEX_USERNAME = '^[\\w.@+-]+$'
 DEFAULT_AVATAR = 'user/default_avatar.png'
 DEFAULT_PAGE_SIZE = 6
+# Конфигурация поисковых запросов. В триггере search_vector она записана
+# миграцией (recipes 0002), поэтому при смене нужна новая миграция,
+# пересоздающая триггер; расхождение ловит тест поиска.
+SEARCH_CONFIG = 'russian'
+MAX_SEARCH_INGREDIENTS = 50
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# Авторы с большим числом подписчиков не рассылают рецепты по лентам,
+# их рецепты подмешиваются при чтении.
+FEED_FANOUT_MAX_SUBSCRIBERS = 5000
+FEED_FANOUT_BATCH_SIZE = 1000
+FEED_BACKFILL_SIZE = 100
+FEED_MAX_PAGE_SIZE = 50
+
+RECOMMENDATION_TOP_K = 20
+RECOMMENDATION_BATCH_SIZE = 5000
+
+# Вклад события в популярность убывает вдвое за TRENDING_HALF_LIFE секунд.
+TRENDING_HALF_LIFE = 24 * 60 * 60
+TRENDING_WEIGHTS = {'favorite': 1.0, 'shopping_cart': 1.5}
+TRENDING_MIN_SCORE = 0.01
+TRENDING_REBUILD_WINDOW = 7 * TRENDING_HALF_LIFE
+TRENDING_BATCH_SIZE = 1000
+# События читаются с отставанием, чтобы не пропустить строки из ещё не
+# закоммиченных транзакций: created_at ставится до коммита.
+TRENDING_CUTOFF_MARGIN = 5
+
+SYNC_PAGE_SIZE = 500
+# Курсор отстаёт от текущего времени, чтобы не пропустить изменения из
+# транзакций, которые ещё не закоммичены.
+SYNC_CURSOR_MARGIN = 5
+SYNC_TOMBSTONE_TTL = 30 * 24 * 60 * 60
+
+# Профилирование запросов: сотрудники включают его заголовком X-Profile,
+# остальные запросы профилируются с вероятностью PROFILING_SAMPLE_RATE
+# (только маршруты из PROFILING_SAMPLE_VIEWS, если список задан).
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'True') == 'True'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+PROFILING_SAMPLE_VIEWS = frozenset(
+    filter(None, os.getenv('PROFILING_SAMPLE_VIEWS', '').split(',')))
+PROFILING_SAMPLE_INTERVAL = 0.005
+PROFILING_SUMMARY_LINES = 40
+PROFILING_KEEP = 200
+
+RECIPE_RESPONSE_CACHE_TIMEOUT = 60 * 60
+RECIPE_FRAGMENT_TIMEOUT = 24 * 60 * 60
+INGREDIENT_CATALOGUE_TIMEOUT = 24 * 60 * 60
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+MAX_IMAGE_PIXELS = 8000 * 8000
+IMAGE_SPOOL_MAX_MEMORY = 1024 * 1024
+ALLOWED_IMAGE_FORMATS = ('jpeg', 'png', 'gif', 'webp')
+IMAGE_RENDITIONS = {'thumb': 160, 'card': 480, 'full': 1280}
+IMAGE_RENDITION_FORMATS = ('webp', 'jpeg')
+IMAGE_RENDITION_QUALITY = 80
+IMAGE_NORMALIZED_MAX_SIZE = 2560
+IMAGE_NORMALIZED_QUALITY = 85
+IMAGE_JOB_MAX_ATTEMPTS = 3
+IMAGE_WORKER_POLL_INTERVAL = 2
+MEDIA_GC_GRACE_PERIOD = 24 * 60 * 60
+EXPORTS_ROOT = os.getenv('EXPORTS_ROOT', '/app/exports')
+EXPORTS_ACCEL_PREFIX = '/protected/exports/'
+EXPORTS_MAX_AGE = 24 * 60 * 60
+USE_X_ACCEL_REDIRECT = os.getenv('USE_X_ACCEL_REDIRECT', 'False') == 'True'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -166,6 +273,10 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'api.paginations.LimitPageNumberPagination',
     'PAGE_SIZE': 6,
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
 DJOSER = {
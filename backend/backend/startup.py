@@ -0,0 +1,66 @@
+import json
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+
+IMPORT_TIME_RE = re.compile(
+    r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+# Выполняется в отдельном интерпретаторе, чтобы измерять холодный
+# запуск, а не уже загруженный процесс.
+PROBE = '''
+import json, resource, sys, time
+start = time.perf_counter()
+cpu_start = time.process_time()
+__import__({module!r})
+from django.urls import get_resolver
+get_resolver().url_patterns
+seconds = time.perf_counter() - start
+# Процессорное время не зависит от того, насколько загружена машина.
+cpu_seconds = time.process_time() - cpu_start
+# ru_maxrss на Linux наследуется от родителя через fork/exec, VmHWM нет.
+max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+try:
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                max_rss_kb = int(line.split()[1])
+except OSError:
+    pass
+print(json.dumps({{
+    'seconds': seconds,
+    'cpu_seconds': cpu_seconds,
+    'max_rss_kb': max_rss_kb,
+    'modules': sorted(sys.modules),
+}}))
+'''
+
+
+def profile_startup(module='backend.wsgi', importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', PROBE.format(module=module)]
+    result = subprocess.run(
+        command,
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=settings.BASE_DIR,
+        env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'backend.settings'},
+    )
+    profile = json.loads(result.stdout.splitlines()[-1])
+    profile['imports'] = [
+        {
+            'name': match[4],
+            'self_us': int(match[1]),
+            'cumulative_us': int(match[2]),
+            'depth': len(match[3]) // 2,
+        }
+        for match in map(IMPORT_TIME_RE.match, result.stderr.splitlines())
+        if match
+    ]
+    return profile
@@ -0,0 +1,42 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    # Файл называется по sha256 содержимого, поэтому одинаковые загрузки
+    # хранятся один раз, а сохранённый файл никогда не меняется.
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        # Имя от клиента не проверяется: хэш всегда считается заново.
+        name = self.content_name(name, content)
+        if self.exists(name):
+            # Совпавший файл мог ждать удаления в collect_media_garbage,
+            # свежее время изменения даёт новой ссылке дойти до коммита.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+    def save_rendition(self, name, content):
+        # Копии картинки называются по имени оригинала и пишутся только
+        # воркером, поэтому сохраняются под заданным именем.
+        if self.exists(name):
+            self.delete(name)
+        return super().save(name, content)
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        digest = digest.hexdigest()
+        ext = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            os.path.dirname(name), digest[:2], f'{digest}{ext}')
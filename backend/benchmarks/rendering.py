@@ -0,0 +1,132 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+import django
+
+DESCRIPTION = '''
+Measure bytes and CPU time per recipe page for each JSON renderer, with
+and without gzip.
+
+The page is built by the recipe list view from the configured database.
+Pass --synthetic to use generated recipes instead:
+
+    python benchmarks/rendering.py --limit 50
+    python benchmarks/rendering.py --synthetic --limit 50
+'''
+
+SYNTHETIC_WORDS = (
+    'нарежьте овощи крупными кусками обжарьте на сильном огне до золотистой '
+    'корочки затем добавьте специи соль перец чеснок и тушите под крышкой '
+    'до мягкости подавайте горячим со свежей зеленью сметаной или хлебом'
+).split()
+
+
+def synthetic_page(limit):
+    rng = random.Random(limit)
+    return {
+        'count': limit,
+        'next': None,
+        'previous': None,
+        'results': [{
+            'id': pk,
+            'author': {
+                'email': f'author{pk}@example.com',
+                'id': pk,
+                'username': f'author{pk}',
+                'first_name': 'Анна',
+                'last_name': 'Иванова',
+                'is_subscribed': False,
+                'avatar': None,
+                'avatar_renditions': None,
+            },
+            'ingredients': [{
+                'id': number,
+                'name': f'Ингредиент {number}',
+                'measurement_unit': 'г',
+                'amount': number * 10,
+            } for number in range(1, 9)],
+            'is_favorited': False,
+            'is_in_shopping_cart': False,
+            'name': f'Рецепт {pk}',
+            'image': f'http://localhost/media/recipes/images/{pk:032x}.jpg',
+            'image_renditions': None,
+            'text': ' '.join(rng.choices(SYNTHETIC_WORDS, k=250)),
+            'cooking_time': 30,
+        } for pk in range(1, limit + 1)],
+    }
+
+
+def database_page(limit):
+    from django.test import RequestFactory
+
+    from api.views import RecipeViewSet
+
+    request = RequestFactory().get(
+        '/api/recipes/', {'limit': limit}, SERVER_NAME='localhost')
+    response = RecipeViewSet.as_view({'get': 'list'})(request)
+    return response.data
+
+
+def cpu_per_call(func, iterations):
+    started = time.process_time()
+    for _ in range(iterations):
+        result = func()
+    return (time.process_time() - started) / iterations, result
+
+
+def run(args):
+    from django.utils.text import compress_string
+    from rest_framework.renderers import JSONRenderer
+
+    from api.renderers import FastJSONRenderer, orjson
+
+    page = None if args.synthetic else database_page(args.limit)
+    if not page or not page['results']:
+        print('no recipes in the database, using a synthetic page')
+        page = synthetic_page(args.limit)
+    recipes = len(page['results'])
+    if orjson is None:
+        print('orjson is not installed, FastJSONRenderer falls back to DRF')
+
+    print(f'recipes per page: {recipes}')
+    print(f'{"renderer":<20}{"bytes":>10}{"gzip bytes":>12}'
+          f'{"render us":>12}{"gzip us":>10}')
+    for name, renderer in (
+            ('JSONRenderer', JSONRenderer()),
+            ('FastJSONRenderer', FastJSONRenderer())):
+        render_time, body = cpu_per_call(
+            lambda: renderer.render(page), args.iterations)
+        gzip_time, compressed = cpu_per_call(
+            lambda: compress_string(body), args.iterations)
+        print(f'{name:<20}{len(body):>10}{len(compressed):>12}'
+              f'{render_time * 1e6:>12.0f}{gzip_time * 1e6:>10.0f}')
+        print(f'{"  per recipe":<20}{len(body) // recipes:>10}'
+              f'{len(compressed) // recipes:>12}'
+              f'{render_time * 1e6 / recipes:>12.1f}'
+              f'{gzip_time * 1e6 / recipes:>10.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=DESCRIPTION,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--limit', type=int, default=50,
+                        help='recipes per page')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--synthetic', action='store_true',
+                        help='do not read recipes from the database')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    django.setup()
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
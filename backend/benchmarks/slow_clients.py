@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+DESCRIPTION = '''
+Measure API throughput while slow clients hold connections open.
+
+Start the server in one mode, run the benchmark, then repeat for the
+other mode and compare:
+
+    gunicorn -c gunicorn.conf.py
+    GUNICORN_WORKER_CLASS=gthread GUNICORN_THREADS=8 \\
+        gunicorn -c gunicorn.conf.py
+    SERVER_MODE=asgi gunicorn -c gunicorn.conf.py
+
+    python benchmarks/slow_clients.py http://127.0.0.1:8000/api/recipes/ \\
+        --slow 50 --pid $(pgrep -o gunicorn)
+'''
+
+
+def build_request(url):
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path = f'{path}?{parts.query}'
+    return parts.hostname, parts.port or 80, (
+        f'GET {path} HTTP/1.1\r\n'
+        f'Host: {parts.netloc}\r\n'
+        'Accept: application/json\r\n'
+        'Connection: close\r\n'
+    )
+
+
+async def slow_client(host, port, request, interval, stop):
+    while not stop.is_set():
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            for char in request:
+                writer.write(char.encode())
+                await writer.drain()
+                await asyncio.sleep(interval)
+                if stop.is_set():
+                    break
+            writer.write(b'\r\n')
+            await writer.drain()
+            while not stop.is_set() and await reader.read(1):
+                await asyncio.sleep(interval)
+            writer.close()
+        except OSError:
+            await asyncio.sleep(interval)
+
+
+async def fast_client(host, port, request, stop, latencies, errors):
+    payload = f'{request}\r\n'.encode()
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(payload)
+            await writer.drain()
+            status_line = await reader.readline()
+            await reader.read()
+            writer.close()
+        except OSError:
+            errors.append(1)
+            continue
+        if b' 200 ' in status_line:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(1)
+
+
+def server_cpu_time(pid):
+    if psutil is None or pid is None:
+        return None
+    process = psutil.Process(pid)
+    total = 0.0
+    for item in [process, *process.children(recursive=True)]:
+        times = item.cpu_times()
+        total += times.user + times.system
+    return total
+
+
+async def run(args):
+    host, port, request = build_request(args.url)
+    stop = asyncio.Event()
+    latencies, errors = [], []
+    cpu_before = server_cpu_time(args.pid)
+    tasks = [
+        asyncio.create_task(
+            slow_client(host, port, request, args.interval, stop))
+        for _ in range(args.slow)
+    ]
+    await asyncio.sleep(args.warmup)
+    tasks += [
+        asyncio.create_task(
+            fast_client(host, port, request, stop, latencies, errors))
+        for _ in range(args.concurrency)
+    ]
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.wait(tasks, timeout=args.interval * 2 + 5)
+    for task in tasks:
+        task.cancel()
+    cpu_after = server_cpu_time(args.pid)
+
+    throughput = len(latencies) / args.duration
+    print(f'slow clients:     {args.slow}')
+    print(f'requests:         {len(latencies)} ok, {len(errors)} failed')
+    print(f'throughput:       {throughput:.1f} req/s')
+    if latencies:
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f'latency p50/p95:  {statistics.median(latencies) * 1000:.1f}'
+              f' / {p95 * 1000:.1f} ms')
+    if cpu_before is not None and cpu_after is not None:
+        cpu = cpu_after - cpu_before
+        per_core = len(latencies) / cpu if cpu else 0
+        print(f'server CPU time:  {cpu:.2f} s')
+        print(f'per core:         {per_core:.1f} req per CPU-second')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=DESCRIPTION,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('url')
+    parser.add_argument('--slow', type=int, default=50,
+                        help='number of slow clients')
+    parser.add_argument('--interval', type=float, default=0.5,
+                        help='seconds between bytes sent by slow clients')
+    parser.add_argument('--concurrency', type=int, default=10,
+                        help='number of fast clients')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--pid', type=int,
+                        help='server master pid for CPU accounting')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'asgi': 'uvicorn.workers.UvicornWorker',
+}
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv(
+    'GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = WORKER_CLASSES[os.getenv(
+    'GUNICORN_WORKER_CLASS',
+    'asgi' if os.getenv('SERVER_MODE') == 'asgi' else 'sync',
+)]
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 0))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+bootstrap = os.getenv('GUNICORN_BOOTSTRAP', 'True') == 'True'
+wsgi_app = (
+    'backend.asgi:application'
+    if worker_class == WORKER_CLASSES['asgi']
+    else 'backend.wsgi:application'
+)
+accesslog = os.getenv('GUNICORN_ACCESSLOG')
+errorlog = '-'
+
+# Метрики воркеров складываются в общий каталог и суммируются в /metrics.
+# Каталог задаётся до импорта prometheus_client и очищается при старте,
+# чтобы не подхватить счётчики прошлого запуска.
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(tempfile.gettempdir(), 'foodgram-metrics'),
+)
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir)
+
+
+def on_starting(server):
+    # Миграции и импорт выполняются в том же интерпретаторе, что и
+    # сервер, поэтому реплика не платит за повторную загрузку Django.
+    if not bootstrap:
+        return
+    import django
+    from django.core.management import call_command
+    from django.db import connections
+    django.setup()
+    call_command('bootstrap')
+    connections.close_all()
+
+
+def when_ready(server):
+    # При preload_app приложение уже загружено в мастере, так что
+    # прогрев до форка достаётся всем воркерам.
+    if not preload_app:
+        return
+    from api.warmup import warm_up
+    warm_up()
+    server.log.info('Application warmed up before forking workers')
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,14 +1,105 @@
 from django.contrib import admin
-
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+
+from backend.profiling import COLLECTORS
+from backend.settings import ADMIN_EXACT_COUNT_LIMIT
 from .models import (
     Favorite,
+    ImageJob,
     Ingredient,
     Recipe,
     RecipeIngredient,
+    RequestProfile,
     ShoppingCart
 )
 
 
+class EstimatedCountPaginator(Paginator):
+    # Для больших таблиц без фильтров COUNT(*) читает всю таблицу,
+    # поэтому берём оценку из статистики PostgreSQL.
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            connection = connections[queryset.db]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class '
+                    'WHERE oid = %s::regclass',
+                    [connection.ops.quote_name(queryset.model._meta.db_table)]
+                )
+                row = cursor.fetchone()
+            if row and row[0] > ADMIN_EXACT_COUNT_LIMIT:
+                return row[0]
+        return super().count
+
+
+class InputFilter(admin.SimpleListFilter):
+    # Поле ввода вместо списка всех связанных объектов в боковой панели.
+    template = 'admin/input_filter.html'
+    lookup = None
+
+    def lookups(self, request, model_admin):
+        return ((None, None),)
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        all_choice['query_parts'] = [
+            (name, value) for name, value in changelist.params.items()
+            if name not in (self.parameter_name, PAGE_VAR)
+        ]
+        yield all_choice
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        try:
+            return queryset.filter(**{self.lookup: value})
+        except ValueError:
+            return queryset.none()
+
+
+class UserFilter(InputFilter):
+    title = 'пользователю (логин)'
+    parameter_name = 'user'
+    lookup = 'user__username'
+
+
+class AuthorFilter(InputFilter):
+    title = 'автору (логин)'
+    parameter_name = 'author'
+    lookup = 'author__username'
+
+
+class RecipeFilter(InputFilter):
+    title = 'рецепту (id)'
+    parameter_name = 'recipe'
+    lookup = 'recipe_id'
+
+
+class IngredientFilter(InputFilter):
+    title = 'ингредиенту'
+    parameter_name = 'ingredient'
+    lookup = 'ingredients__name'
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')  # Поля в списке
@@ -18,6 +109,7 @@ class IngredientAdmin(admin.ModelAdmin):
 
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
+    autocomplete_fields = ('ingredients',)
     extra = 1
     min_num = 1
     verbose_name = 'Ингредиент'
@@ -25,15 +117,33 @@ class RecipeIngredientInline(admin.TabularInline):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(LargeTableAdmin):
     list_display = ('name', 'author', 'get_favorite_count')
+    list_select_related = ('author',)
     search_fields = ('name', 'author__username', 'author__email')
-    list_filter = ('author',)
+    list_filter = (AuthorFilter,)
+    autocomplete_fields = ('author',)
     readonly_fields = ('get_favorite_count',)
 
+    def get_queryset(self, request):
+        # Подзапрос считается только для строк текущей страницы.
+        favorites = Favorite.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(total=Count('*'))
+        return super().get_queryset(request).annotate(
+            favorite_count=Coalesce(
+                Subquery(favorites.values('total'),
+                         output_field=IntegerField()),
+                0,
+            )
+        )
+
     def get_favorite_count(self, obj):
+        if hasattr(obj, 'favorite_count'):
+            return obj.favorite_count
         return obj.favorite.count()
     get_favorite_count.short_description = 'В избранном'
+    get_favorite_count.admin_order_field = 'favorite_count'
 
     fieldsets = (
         (None, {
@@ -49,29 +159,96 @@ class RecipeAdmin(admin.ModelAdmin):
 
     def change_view(self, request, object_id, form_url='', extra_context=None):
         extra_context = extra_context or {}
-        recipe = Recipe.objects.get(pk=object_id)
-        extra_context['favorite_count'] = self.get_favorite_count(recipe)
+        recipe = self.get_object(request, object_id)
+        if recipe is not None:
+            extra_context['favorite_count'] = self.get_favorite_count(recipe)
         return super().change_view(
             request, object_id, form_url, extra_context=extra_context,
         )
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
-    list_display = ('user', 'recipe')
+class FavoriteAdmin(LargeTableAdmin):
+    list_display = ('user', 'recipe', 'created_at')
+    list_select_related = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
-    list_filter = ('user', 'recipe')
+    list_filter = (UserFilter, RecipeFilter)
+    autocomplete_fields = ('user', 'recipe')
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
-    list_display = ('user', 'recipe')
+class ShoppingCartAdmin(LargeTableAdmin):
+    list_display = ('user', 'recipe', 'created_at')
+    list_select_related = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
-    list_filter = ('user', 'recipe')
+    list_filter = (UserFilter, RecipeFilter)
+    autocomplete_fields = ('user', 'recipe')
 
 
 @admin.register(RecipeIngredient)
-class RecipeIngredientAdmin(admin.ModelAdmin):
+class RecipeIngredientAdmin(LargeTableAdmin):
     list_display = ('recipe', 'ingredients', 'amount')
+    list_select_related = ('recipe', 'ingredients')
     search_fields = ('recipe__name', 'ingredients__name')
-    list_filter = ('recipe', 'ingredients')
+    list_filter = (RecipeFilter, IngredientFilter)
+    autocomplete_fields = ('recipe', 'ingredients')
+
+
+@admin.register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'model_label', 'object_id', 'image_name', 'status', 'attempts',
+        'updated_at',
+    )
+    list_filter = ('status', 'model_label')
+    readonly_fields = ('error',)
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        'created_at', 'method', 'path', 'status_code', 'duration',
+        'sql_queries', 'sql_time', 'serializer_time', 'mode', 'download',
+    )
+    list_filter = ('mode', 'view_name')
+    search_fields = ('path',)
+    exclude = ('data',)
+    readonly_fields = (
+        'created_at', 'user', 'method', 'path', 'view_name', 'status_code',
+        'mode', 'duration', 'sql_queries', 'sql_time', 'serializer_time',
+        'summary', 'download',
+    )
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('data')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/',
+                self.admin_site.admin_view(self.download_view),
+                name='recipes_requestprofile_download',
+            ),
+        ] + super().get_urls()
+
+    @admin.display(description='Файл')
+    def download(self, obj):
+        return format_html('<a href="{}">Скачать</a>', reverse(
+            'admin:recipes_requestprofile_download', args=(obj.pk,)))
+
+    def download_view(self, request, pk):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        extension = COLLECTORS[profile.mode].extension
+        response = HttpResponse(
+            bytes(profile.data), content_type='application/octet-stream')
+        response['Content-Disposition'] = (
+            f'attachment; filename="profile-{pk}.{extension}"')
+        return response
@@ -0,0 +1,142 @@
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from backend.metrics import record_cache
+from backend.settings import (
+    INGREDIENT_CATALOGUE_TIMEOUT,
+    RECIPE_FRAGMENT_TIMEOUT
+)
+
+from .models import Ingredient
+
+RECIPE_VERSION_KEY = 'recipes:version:{pk}'
+RECIPE_LIST_VERSION_KEY = 'recipes:version:list'
+
+
+def _new_version():
+    return uuid.uuid4().hex
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_recipe_version(pk):
+    return _get_version(RECIPE_VERSION_KEY.format(pk=pk))
+
+
+def get_recipe_list_version():
+    return _get_version(RECIPE_LIST_VERSION_KEY)
+
+
+def bump_recipe_versions(recipe_ids):
+    versions = {
+        RECIPE_VERSION_KEY.format(pk=pk): _new_version()
+        for pk in recipe_ids
+    }
+    versions[RECIPE_LIST_VERSION_KEY] = _new_version()
+    cache.set_many(versions, None)
+
+
+def invalidate_recipes(recipe_ids):
+    # Сбрасываем версии сразу и ещё раз после коммита, чтобы в кэш не
+    # попал ответ, прочитанный до завершения транзакции.
+    recipe_ids = list(recipe_ids)
+    bump_recipe_versions(recipe_ids)
+    transaction.on_commit(lambda: bump_recipe_versions(recipe_ids))
+
+
+RECIPE_FRAGMENT_KEY = 'recipes:fragment:{prefix}:{pk}:{version}'
+FRAGMENT_HITS_KEY = 'recipes:stats:fragment_hits'
+FRAGMENT_MISSES_KEY = 'recipes:stats:fragment_misses'
+
+
+def get_recipe_versions(recipe_ids):
+    keys = {RECIPE_VERSION_KEY.format(pk=pk): pk for pk in recipe_ids}
+    versions = {
+        keys[key]: version
+        for key, version in cache.get_many(keys).items()
+    }
+    for key, pk in keys.items():
+        if pk not in versions:
+            versions[pk] = _get_version(key)
+    return versions
+
+
+def _fragment_keys(prefix, versions):
+    return {
+        RECIPE_FRAGMENT_KEY.format(prefix=prefix, pk=pk, version=version): pk
+        for pk, version in versions.items()
+    }
+
+
+def get_recipe_fragments(prefix, recipe_ids):
+    versions = get_recipe_versions(recipe_ids)
+    keys = _fragment_keys(prefix, versions)
+    fragments = {
+        keys[key]: fragment
+        for key, fragment in cache.get_many(keys).items()
+    }
+    _incr_stat(FRAGMENT_HITS_KEY, len(fragments))
+    _incr_stat(FRAGMENT_MISSES_KEY, len(keys) - len(fragments))
+    record_cache('recipe_fragment', len(fragments), len(keys) - len(fragments))
+    return fragments, versions
+
+
+def set_recipe_fragments(prefix, fragments, versions):
+    keys = _fragment_keys(
+        prefix, {pk: versions[pk] for pk in fragments})
+    cache.set_many(
+        {key: fragments[pk] for key, pk in keys.items()},
+        RECIPE_FRAGMENT_TIMEOUT
+    )
+
+
+def _incr_stat(key, delta):
+    if not delta:
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key, delta)
+
+
+def get_fragment_stats():
+    stats = cache.get_many((FRAGMENT_HITS_KEY, FRAGMENT_MISSES_KEY))
+    return (
+        stats.get(FRAGMENT_HITS_KEY, 0),
+        stats.get(FRAGMENT_MISSES_KEY, 0),
+    )
+
+
+def reset_fragment_stats():
+    cache.delete_many((FRAGMENT_HITS_KEY, FRAGMENT_MISSES_KEY))
+
+
+INGREDIENT_CATALOGUE_KEY = 'ingredients:catalogue'
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit')
+
+
+def get_ingredient_catalogue():
+    catalogue = cache.get(INGREDIENT_CATALOGUE_KEY)
+    if catalogue is not None:
+        record_cache('ingredient_catalogue', 1)
+    else:
+        record_cache('ingredient_catalogue', 0, 1)
+        catalogue = list(
+            Ingredient.objects.order_by('pk').values(*INGREDIENT_FIELDS))
+        cache.set(
+            INGREDIENT_CATALOGUE_KEY, catalogue, INGREDIENT_CATALOGUE_TIMEOUT)
+    return catalogue
+
+
+def invalidate_ingredient_catalogue():
+    cache.delete(INGREDIENT_CATALOGUE_KEY)
+    transaction.on_commit(lambda: cache.delete(INGREDIENT_CATALOGUE_KEY))
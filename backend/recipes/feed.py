@@ -0,0 +1,109 @@
+from itertools import islice
+
+from django.db.models import F, Q
+
+from backend.settings import (
+    FEED_BACKFILL_SIZE,
+    FEED_FANOUT_BATCH_SIZE,
+    FEED_FANOUT_MAX_SUBSCRIBERS
+)
+from .models import FeedBackfill, FeedEntry, Recipe
+from users.models import Subscription, User
+
+
+def is_popular_author(author_id):
+    return User.objects.filter(
+        pk=author_id,
+        subscribers_count__gt=FEED_FANOUT_MAX_SUBSCRIBERS,
+    ).exists()
+
+
+def _add_entries(entries):
+    entries = iter(entries)
+    while batch := list(islice(entries, FEED_FANOUT_BATCH_SIZE)):
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_recipe(recipe):
+    if is_popular_author(recipe.author_id):
+        return
+    subscribers = Subscription.objects.filter(
+        author_id=recipe.author_id
+    ).values_list('subscriber_id', flat=True)
+    _add_entries(
+        FeedEntry(user_id=user_id, recipe=recipe, author_id=recipe.author_id)
+        for user_id in subscribers.iterator(chunk_size=FEED_FANOUT_BATCH_SIZE)
+    )
+
+
+def backfill_feed(subscriber_id, author_id):
+    if is_popular_author(author_id):
+        return
+    recipe_ids = Recipe.objects.filter(
+        author_id=author_id
+    ).order_by('-id').values_list('id', flat=True)[:FEED_BACKFILL_SIZE]
+    _add_entries(
+        FeedEntry(user_id=subscriber_id, recipe_id=pk, author_id=author_id)
+        for pk in recipe_ids
+    )
+
+
+def backfill_author_feeds(author_id):
+    # Рецепты популярного автора не рассылались, а подмешивались при
+    # чтении. Когда подписчиков становится не больше порога, ленты
+    # подписчиков дозаполняются, после чего подмешивание прекращается.
+    recipe_ids = list(Recipe.objects.filter(
+        author_id=author_id
+    ).order_by('-id').values_list('id', flat=True)[:FEED_BACKFILL_SIZE])
+    subscribers = Subscription.objects.filter(
+        author_id=author_id
+    ).values_list('subscriber_id', flat=True)
+    _add_entries(
+        FeedEntry(user_id=user_id, recipe_id=pk, author_id=author_id)
+        for user_id in subscribers.iterator(chunk_size=FEED_FANOUT_BATCH_SIZE)
+        for pk in recipe_ids
+    )
+    FeedBackfill.objects.filter(author_id=author_id).delete()
+
+
+def remove_from_feed(subscriber_id, author_id):
+    FeedEntry.objects.filter(
+        user_id=subscriber_id, author_id=author_id).delete()
+
+
+def change_subscribers_count(author_id, delta):
+    authors = User.objects.filter(pk=author_id)
+    if delta < 0:
+        authors = authors.filter(subscribers_count__gte=-delta)
+    authors.update(subscribers_count=F('subscribers_count') + delta)
+    # Дозаполнение лент может занять тысячи строк, поэтому в запросе
+    # автор только ставится в очередь для rebuild_feeds --pending.
+    if delta < 0 and User.objects.filter(
+        pk=author_id,
+        subscribers_count__gt=FEED_FANOUT_MAX_SUBSCRIBERS + delta,
+        subscribers_count__lte=FEED_FANOUT_MAX_SUBSCRIBERS,
+    ).exists():
+        FeedBackfill.objects.get_or_create(author_id=author_id)
+
+
+def get_feed_recipe_ids(user, limit, before=None):
+    # Лента читается из готовых записей, а рецепты популярных авторов,
+    # которые не рассылаются при создании, и авторов из очереди
+    # дозаполнения подмешиваются здесь.
+    entries = FeedEntry.objects.filter(user=user)
+    if before is not None:
+        entries = entries.filter(recipe_id__lt=before)
+    recipe_ids = set(entries.order_by('-recipe_id').values_list(
+        'recipe_id', flat=True)[:limit])
+    popular_authors = list(Subscription.objects.filter(
+        Q(author__subscribers_count__gt=FEED_FANOUT_MAX_SUBSCRIBERS)
+        | Q(author__feed_backfill__isnull=False),
+        subscriber=user,
+    ).values_list('author_id', flat=True))
+    if popular_authors:
+        recipes = Recipe.objects.filter(author_id__in=popular_authors)
+        if before is not None:
+            recipes = recipes.filter(id__lt=before)
+        recipe_ids.update(recipes.order_by('-id').values_list(
+            'id', flat=True)[:limit])
+    return sorted(recipe_ids, reverse=True)[:limit]
@@ -0,0 +1,155 @@
+import logging
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+
+from backend.settings import (
+    IMAGE_NORMALIZED_MAX_SIZE,
+    IMAGE_NORMALIZED_QUALITY,
+    IMAGE_RENDITION_FORMATS,
+    IMAGE_RENDITION_QUALITY,
+    IMAGE_RENDITIONS
+)
+from .cache import invalidate_recipes
+from .sync import touch_recipes
+
+logger = logging.getLogger(__name__)
+
+PILLOW_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+
+def rendition_name(name, rendition, image_format):
+    root, _ = os.path.splitext(name)
+    return f'{root}.{rendition}.{image_format}'
+
+
+def rendered_field_name(field_name):
+    # В rendered_<поле> воркер пишет имя картинки, для которой он создал
+    # копии. После замены картинки имена расходятся до следующего прогона.
+    return f'rendered_{field_name}'
+
+
+def marker_name(name):
+    # Последняя сохраняемая копия служит признаком того, что готовы все.
+    return rendition_name(
+        name, list(IMAGE_RENDITIONS)[-1], IMAGE_RENDITION_FORMATS[-1])
+
+
+def renditions_ready(field_file):
+    return bool(field_file) and field_file.name == getattr(
+        field_file.instance, rendered_field_name(field_file.field.name), None)
+
+
+def mark_renditions_ready(field_file):
+    instance = field_file.instance
+    rendered = rendered_field_name(field_file.field.name)
+    updated = type(instance).objects.filter(
+        pk=instance.pk, **{field_file.field.name: field_file.name}
+    ).update(**{rendered: field_file.name})
+    setattr(instance, rendered, field_file.name)
+    if not updated:
+        return
+    # update() не вызывает сигналы, поэтому закэшированные ответы с
+    # пустыми копиями сбрасываются здесь.
+    if instance._meta.label == 'recipes.Recipe':
+        recipe_ids = [instance.pk]
+    else:
+        recipe_ids = list(instance.recipes.values_list('pk', flat=True))
+    invalidate_recipes(recipe_ids)
+    touch_recipes(recipe_ids)
+
+
+def get_rendition_names(name):
+    return {
+        rendition: {
+            image_format: rendition_name(name, rendition, image_format)
+            for image_format in IMAGE_RENDITION_FORMATS
+        }
+        for rendition in IMAGE_RENDITIONS
+    }
+
+
+def _to_rgb(image):
+    from PIL import Image
+
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def generate_renditions(field_file):
+    from PIL import Image, ImageOps
+
+    storage = field_file.storage
+    with field_file.open('rb'), Image.open(field_file) as original:
+        image = _to_rgb(ImageOps.exif_transpose(original))
+    for rendition, size in IMAGE_RENDITIONS.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        for image_format in IMAGE_RENDITION_FORMATS:
+            buffer = BytesIO()
+            resized.save(
+                buffer,
+                PILLOW_FORMATS[image_format],
+                quality=IMAGE_RENDITION_QUALITY,
+                optimize=True,
+            )
+            storage.save_rendition(
+                rendition_name(field_file.name, rendition, image_format),
+                ContentFile(buffer.getvalue()),
+            )
+
+
+def normalize_image(field_file):
+    # Пересохраняем оригинал без EXIF, с учётом ориентации и
+    # ограничением размера. Анимированные изображения не трогаем.
+    from PIL import Image, ImageOps
+
+    with field_file.open('rb'), Image.open(field_file) as original:
+        image_format = original.format
+        if getattr(original, 'is_animated', False):
+            return field_file.name
+        image = ImageOps.exif_transpose(original)
+        image.thumbnail(
+            (IMAGE_NORMALIZED_MAX_SIZE, IMAGE_NORMALIZED_MAX_SIZE),
+            Image.LANCZOS,
+        )
+        if image_format == 'JPEG':
+            image = image.convert('RGB')
+        buffer = BytesIO()
+        image.save(
+            buffer,
+            image_format,
+            quality=IMAGE_NORMALIZED_QUALITY,
+            optimize=True,
+        )
+    # Оригинал не удаляем: на него могут ссылаться другие объекты,
+    # неиспользуемые файлы убирает collect_media_garbage. Новое имя
+    # хранилище построит по хэшу пересохранённого содержимого.
+    name = field_file.field.generate_filename(
+        field_file.instance,
+        f'image{os.path.splitext(field_file.name)[1]}')
+    return field_file.storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def ensure_renditions(field_file):
+    if not field_file or renditions_ready(field_file):
+        return
+    # Копии, созданные до появления rendered_<поле>, уже лежат в
+    # хранилище и только отмечаются готовыми.
+    if field_file.storage.exists(marker_name(field_file.name)):
+        mark_renditions_ready(field_file)
+        return
+    try:
+        generate_renditions(field_file)
+    except OSError:
+        logger.warning(
+            'Не удалось создать копии изображения %s', field_file.name,
+            exc_info=True,
+        )
+        return
+    mark_renditions_ready(field_file)
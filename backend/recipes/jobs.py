@@ -0,0 +1,76 @@
+import logging
+
+from django.apps import apps
+from django.db import transaction
+
+from backend.settings import IMAGE_JOB_MAX_ATTEMPTS
+from .images import (
+    generate_renditions,
+    mark_renditions_ready,
+    normalize_image,
+    renditions_ready
+)
+from .models import ImageJob
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_image_job(instance, field_name):
+    field_file = getattr(instance, field_name)
+    if not field_file or renditions_ready(field_file):
+        return None
+    job, _ = ImageJob.objects.get_or_create(
+        model_label=instance._meta.label,
+        object_id=instance.pk,
+        field_name=field_name,
+        image_name=field_file.name,
+        status=ImageJob.PENDING,
+    )
+    return job
+
+
+def process_image_job(job):
+    model = apps.get_model(job.model_label)
+    instance = model.objects.filter(pk=job.object_id).first()
+    field_file = instance and getattr(instance, job.field_name)
+    if not field_file or field_file.name != job.image_name:
+        # Объект удалён или картинку уже заменили новой.
+        return
+    name = normalize_image(field_file)
+    if name != field_file.name:
+        updated = model.objects.filter(
+            pk=instance.pk, **{job.field_name: job.image_name}
+        ).update(**{job.field_name: name})
+        if not updated:
+            # Пока шла обработка, загрузили новую картинку, и её
+            # обработает собственная задача.
+            return
+        field_file.name = name
+    generate_renditions(field_file)
+    mark_renditions_ready(field_file)
+
+
+def process_next_image_job():
+    with transaction.atomic():
+        job = (
+            ImageJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ImageJob.PENDING)
+            .order_by('id')
+            .first()
+        )
+        if job is None:
+            return None
+        job.attempts += 1
+        try:
+            with transaction.atomic():
+                process_image_job(job)
+        except Exception as error:
+            logger.exception('Ошибка обработки изображения %s', job)
+            job.error = str(error)
+            if job.attempts >= IMAGE_JOB_MAX_ATTEMPTS:
+                job.status = ImageJob.FAILED
+        else:
+            job.status = ImageJob.DONE
+            job.error = ''
+        job.save()
+        return job
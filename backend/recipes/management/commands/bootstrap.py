@@ -0,0 +1,45 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+
+from backend.settings import BOOTSTRAP_LOCK_ID
+from recipes.models import Ingredient
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Apply migrations and import initial data once per database'
+
+    def handle(self, *args, **kwargs):
+        # Обычный запуск реплики: миграции применены, данные загружены,
+        # блокировка не нужна.
+        if self.is_bootstrapped():
+            self.stdout.write(self.style.SUCCESS(
+                'Database is already bootstrapped'))
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_lock(%s)', [BOOTSTRAP_LOCK_ID])
+            try:
+                # Пока ждали блокировку, работу могла сделать другая реплика.
+                if self.has_pending_migrations():
+                    call_command('migrate', interactive=False)
+                if not User.objects.exists():
+                    call_command('import_users')
+                if not Ingredient.objects.exists():
+                    call_command('import_recipes')
+            finally:
+                cursor.execute(
+                    'SELECT pg_advisory_unlock(%s)', [BOOTSTRAP_LOCK_ID])
+        self.stdout.write(self.style.SUCCESS('Successfully bootstrapped'))
+
+    def has_pending_migrations(self):
+        executor = MigrationExecutor(connection)
+        return bool(executor.migration_plan(
+            executor.loader.graph.leaf_nodes()))
+
+    def is_bootstrapped(self):
+        return (
+            not self.has_pending_migrations()
+            and Ingredient.objects.exists()
+        )
@@ -0,0 +1,90 @@
+import os
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from backend.settings import (
+    IMAGE_RENDITION_FORMATS,
+    IMAGE_RENDITIONS,
+    MEDIA_GC_GRACE_PERIOD
+)
+from recipes.images import rendition_name
+from recipes.models import ImageJob, Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Delete media files that are not referenced by any object'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report files that would be deleted',
+        )
+        parser.add_argument(
+            '--grace-period',
+            type=int,
+            default=MEDIA_GC_GRACE_PERIOD,
+            help='Keep files modified less than this many seconds ago',
+        )
+
+    def handle(self, *args, **options):
+        references = self.count_references()
+        directories = {
+            Recipe._meta.get_field('image').upload_to,
+            User._meta.get_field('avatar').upload_to,
+        }
+        deadline = time.time() - options['grace_period']
+        deleted = 0
+        for directory in directories:
+            for name in self.walk(directory):
+                if references.get(name):
+                    continue
+                modified = default_storage.get_modified_time(name)
+                if modified.timestamp() > deadline:
+                    continue
+                self.stdout.write(f'Unreferenced: {name}')
+                if not options['dry_run']:
+                    default_storage.delete(name)
+                deleted += 1
+        action = 'Found' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {deleted} unreferenced files'))
+
+    def count_references(self):
+        references = {}
+        counted = (
+            Recipe.objects.values_list('image')
+            .annotate(refs=Count('pk')).order_by(),
+            User.objects.values_list('avatar')
+            .annotate(refs=Count('pk')).order_by(),
+            ImageJob.objects.filter(status=ImageJob.PENDING)
+            .values_list('image_name').annotate(refs=Count('pk')).order_by(),
+        )
+        for queryset in counted:
+            for name, refs in queryset:
+                if not name:
+                    continue
+                for referenced in (name, *self.rendition_names(name)):
+                    references[referenced] = (
+                        references.get(referenced, 0) + refs)
+        return references
+
+    def rendition_names(self, name):
+        return [
+            rendition_name(name, rendition, image_format)
+            for rendition in IMAGE_RENDITIONS
+            for image_format in IMAGE_RENDITION_FORMATS
+        ]
+
+    def walk(self, directory):
+        if not default_storage.exists(directory):
+            return
+        subdirectories, files = default_storage.listdir(directory)
+        for file_name in files:
+            yield os.path.join(directory, file_name)
+        for subdirectory in subdirectories:
+            yield from self.walk(os.path.join(directory, subdirectory))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from backend.settings import RECOMMENDATION_TOP_K
+from recipes.recommendations import compute_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Recompute similar recipes and personal recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=RECOMMENDATION_TOP_K,
+            help='Number of neighbours stored per recipe and user',
+        )
+
+    def handle(self, *args, **options):
+        similar, recommended = compute_recommendations(options['top_k'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully stored {similar} similar recipes and '
+            f'{recommended} recommendations'))
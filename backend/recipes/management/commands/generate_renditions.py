@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from recipes.images import ensure_renditions
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate missing image renditions for recipes and avatars '
+        'and mark existing ones ready'
+    )
+
+    def handle(self, *args, **kwargs):
+        recipes = Recipe.objects.exclude(image='').exclude(
+            image=F('rendered_image')).only('image', 'rendered_image')
+        for recipe in recipes:
+            ensure_renditions(recipe.image)
+        users = User.objects.exclude(avatar='').exclude(
+            avatar=F('rendered_avatar')).only('avatar', 'rendered_avatar')
+        for user in users:
+            ensure_renditions(user.avatar)
+        self.stdout.write(self.style.SUCCESS(
+            'Successfully generated renditions'))
@@ -3,6 +3,7 @@ import os
 
 from django.core.management.base import BaseCommand
 
+from recipes.cache import invalidate_ingredient_catalogue
 from recipes.models import Ingredient, Recipe, RecipeIngredient
 from users.models import User
 
@@ -26,6 +27,7 @@ class Command(BaseCommand):
                 for item in data
             ]
             Ingredient.objects.bulk_create(ingredients)
+            invalidate_ingredient_catalogue()
             self.stdout.write(self.style.SUCCESS(
                 'Successfully imported ingredients'))
 
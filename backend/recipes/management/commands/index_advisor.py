@@ -0,0 +1,102 @@
+from collections import Counter, defaultdict
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand
+
+from backend.index_advisor import (
+    classify,
+    describe,
+    explain,
+    find_seq_scans,
+    format_plan,
+    get_models,
+    get_scenarios,
+    replay,
+    suggest_migrations
+)
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay representative API calls, EXPLAIN ANALYZE their queries '
+        'and suggest indexes for sequential scans'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Username to replay authenticated calls as '
+                 '(default: the user with the largest shopping cart)',
+        )
+        parser.add_argument(
+            '--apps',
+            nargs='+',
+            default=('recipes', 'users'),
+            help='Apps whose tables are checked for sequential scans',
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.get(username=options['user'])
+        user, scenarios = get_scenarios(user)
+        models_by_table = get_models(options['apps'])
+        indexes = {}
+        missing = defaultdict(Counter)
+
+        for path, params, authenticated in scenarios:
+            url = f'{path}?{urlencode(params)}' if params else path
+            status_code, queries = replay(user, path, params, authenticated)
+            repeats = Counter(
+                (query['alias'], query['sql']) for query in queries)
+            self.stdout.write(
+                f'GET {url} [{status_code}]: {len(queries)} queries, '
+                f'{sum(query["duration"] for query in queries) * 1000:.1f} ms'
+            )
+            explained = set()
+            for query in queries:
+                key = query['alias'], query['sql']
+                if key in explained:
+                    continue
+                explained.add(key)
+                plan = explain(query)
+                if options['verbosity'] > 1:
+                    self.stdout.write(
+                        f'  x{repeats[key]} {query["sql"]}\n  '
+                        f'{plan["Execution Time"]:.3f} ms')
+                    for line in format_plan(plan['Plan'], 2):
+                        self.stdout.write(line)
+                for scan in find_seq_scans(plan['Plan']):
+                    if scan['table'] not in models_by_table:
+                        continue
+                    fields, suggestions = classify(
+                        scan, models_by_table, indexes)
+                    if not fields:
+                        continue
+                    for suggestion in suggestions:
+                        missing[suggestion][url] += scan['rows_removed']
+                    self.stdout.write(
+                        f'  seq scan on {scan["table"]} '
+                        f'({", ".join(fields)}): '
+                        f'{scan["rows_removed"]} rows removed, '
+                        f'{scan["time"]:.3f} ms, '
+                        + ('no index' if suggestions else 'index exists')
+                    )
+
+        if not missing:
+            self.stdout.write(self.style.SUCCESS(
+                f'Successfully checked {len(scenarios)} calls, '
+                'no missing indexes found'))
+            return
+        self.stdout.write('\nMissing indexes:')
+        for suggestion, calls in missing.items():
+            self.stdout.write(
+                f'  {describe(*suggestion)}: '
+                f'{len(calls)} calls, '
+                f'{sum(calls.values())} rows removed by filter')
+        for app_label, source in suggest_migrations(missing).items():
+            self.stdout.write(
+                f'\nSuggested migration for {app_label} (mirror AddIndex '
+                'operations in Meta.indexes):\n')
+            self.stdout.write(source)
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.settings import IMAGE_WORKER_POLL_INTERVAL
+from recipes.jobs import process_next_image_job
+
+
+class Command(BaseCommand):
+    help = 'Process queued image normalization and rendition jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when the queue is empty',
+        )
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            job = process_next_image_job()
+            if job is not None:
+                processed += 1
+                continue
+            if options['once']:
+                break
+            time.sleep(IMAGE_WORKER_POLL_INTERVAL)
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully processed {processed} image jobs'))
@@ -0,0 +1,63 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from backend.startup import profile_startup
+
+
+class Command(BaseCommand):
+    help = 'Report the slowest imports when loading the application'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--module',
+            default='backend.wsgi',
+            help='Entry point to import, e.g. backend.asgi',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Number of imports to show',
+        )
+        parser.add_argument(
+            '--sort',
+            choices=('cumulative', 'self'),
+            default='cumulative',
+            help='Sort imports by cumulative or self time',
+        )
+        parser.add_argument(
+            '--packages',
+            action='store_true',
+            help='Group self time by top-level package',
+        )
+
+    def handle(self, *args, **options):
+        # Время и память меряются отдельным запуском: -X importtime сам
+        # заметно замедляет импорт.
+        summary = profile_startup(options['module'])
+        profile = profile_startup(options['module'], importtime=True)
+        self.stdout.write(
+            f'{options["module"]}: {summary["seconds"] * 1000:.0f} ms '
+            f'({summary["cpu_seconds"] * 1000:.0f} ms CPU), '
+            f'max RSS {summary["max_rss_kb"] / 1024:.1f} MB, '
+            f'{len(summary["modules"])} modules'
+        )
+        if options['packages']:
+            rows = defaultdict(int)
+            for item in profile['imports']:
+                rows[item['name'].split('.')[0]] += item['self_us']
+            rows = sorted(rows.items(), key=lambda row: -row[1])
+            self.stdout.write(f'{"self ms":>9}  package')
+            for name, self_us in rows[:options['limit']]:
+                self.stdout.write(f'{self_us / 1000:9.1f}  {name}')
+            return
+        key = f'{options["sort"]}_us'
+        rows = sorted(profile['imports'], key=lambda item: -item[key])
+        self.stdout.write(f'{"cumul ms":>9} {"self ms":>9}  module')
+        for item in rows[:options['limit']]:
+            self.stdout.write(
+                f'{item["cumulative_us"] / 1000:9.1f} '
+                f'{item["self_us"] / 1000:9.1f}  '
+                f'{"  " * item["depth"]}{item["name"]}'
+            )
@@ -0,0 +1,22 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.settings import EXPORTS_MAX_AGE, EXPORTS_ROOT
+
+
+class Command(BaseCommand):
+    help = 'Delete generated export files older than EXPORTS_MAX_AGE'
+
+    def handle(self, *args, **kwargs):
+        deadline = time.time() - EXPORTS_MAX_AGE
+        deleted = 0
+        for directory, _, files in os.walk(EXPORTS_ROOT):
+            for file_name in files:
+                path = os.path.join(directory, file_name)
+                if os.path.getmtime(path) < deadline:
+                    os.remove(path)
+                    deleted += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully deleted {deleted} export files'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from recipes.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Delete sync tombstones older than SYNC_TOMBSTONE_TTL'
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully deleted {deleted} tombstones'))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from backend.settings import FEED_FANOUT_MAX_SUBSCRIBERS
+from recipes.feed import backfill_author_feeds, backfill_feed
+from recipes.models import FeedBackfill
+from users.models import Subscription, User
+
+
+class Command(BaseCommand):
+    help = 'Recount subscribers and refill followed-authors feeds'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pending',
+            action='store_true',
+            help='Only refill feeds for authors queued after dropping '
+                 'below FEED_FANOUT_MAX_SUBSCRIBERS',
+        )
+
+    def handle(self, *args, **options):
+        pending = list(FeedBackfill.objects.values_list(
+            'author_id', flat=True))
+        if options['pending']:
+            for author_id in pending:
+                backfill_author_feeds(author_id)
+            self.stdout.write(self.style.SUCCESS(
+                f'Successfully refilled feeds for {len(pending)} authors'))
+            return
+
+        subscribers = Subscription.objects.filter(
+            author=OuterRef('pk')
+        ).order_by().values('author').annotate(
+            total=Count('*')).values('total')
+        User.objects.update(
+            subscribers_count=Coalesce(Subquery(subscribers), 0))
+
+        subscriptions = Subscription.objects.filter(
+            author__subscribers_count__lte=FEED_FANOUT_MAX_SUBSCRIBERS
+        ).values_list('subscriber_id', 'author_id')
+        total = 0
+        for subscriber_id, author_id in subscriptions.iterator():
+            backfill_feed(subscriber_id, author_id)
+            total += 1
+        # Полная пересборка покрывает и авторов из очереди.
+        FeedBackfill.objects.filter(author_id__in=pending).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully rebuilt feeds for {total} subscriptions'))
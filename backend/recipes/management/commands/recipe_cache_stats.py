@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipes.cache import get_fragment_stats, reset_fragment_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit rate of the recipe fragment cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset counters after printing them',
+        )
+
+    def handle(self, *args, **options):
+        hits, misses = get_fragment_stats()
+        total = hits + misses
+        hit_rate = hits / total * 100 if total else 0
+        self.stdout.write(
+            f'Hits: {hits}\nMisses: {misses}\nHit rate: {hit_rate:.1f}%')
+        if options['reset']:
+            reset_fragment_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
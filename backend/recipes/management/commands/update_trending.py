@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from recipes.trending import update_trending
+
+
+class Command(BaseCommand):
+    help = 'Decay trending scores and add favorites and cart events'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute scores from scratch over the rebuild window',
+        )
+
+    def handle(self, *args, **options):
+        updated = update_trending(rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully updated trending scores for {updated} recipes'))
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.24 on 2026-10-19 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipeingredient',
+            index=models.Index(fields=['ingredients', 'recipe'], name='ingredient_recipe_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 3.2.24 on 2026-10-19 10:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('computed_at', models.DateTimeField(verbose_name='Пересчитано')),
+            ],
+            options={
+                'verbose_name': 'Пересчёт популярности',
+                'verbose_name_plural': 'Пересчёты популярности',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('score', models.FloatField(verbose_name='Популярность')),
+            ],
+            options={
+                'verbose_name': 'Популярность рецепта',
+                'verbose_name_plural': 'Популярность рецептов',
+            },
+        ),
+        # Время уже существующих записей неизвестно: оставляем NULL, чтобы
+        # они не выглядели новыми для расчёта популярности.
+        migrations.AddField(
+            model_name='favorite',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, editable=False, null=True, verbose_name='Добавлено'),
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False, null=True, verbose_name='Добавлено'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, editable=False, null=True, verbose_name='Добавлено'),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False, null=True, verbose_name='Добавлено'),
+        ),
+        migrations.AddIndex(
+            model_name='trendingscore',
+            index=models.Index(fields=['-score'], name='trending_score_idx'),
+        ),
+    ]
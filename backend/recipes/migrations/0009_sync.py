@@ -0,0 +1,37 @@
+# Generated by Django 3.2.24 on 2026-10-19 11:01
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('recipe', 'Рецепт'), ('favorite', 'Избранное'), ('shopping_cart', 'Список покупок')], max_length=16, verbose_name='Тип')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='ID рецепта')),
+                ('user_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID пользователя')),
+                ('deleted_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Удалён')),
+            ],
+            options={
+                'verbose_name': 'Удалённый объект',
+                'verbose_name_plural': 'Удалённые объекты',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Изменён'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['user_id', 'deleted_at'], name='tombstone_user_deleted_idx'),
+        ),
+    ]
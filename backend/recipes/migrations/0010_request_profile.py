@@ -0,0 +1,40 @@
+# Generated by Django 3.2.24 on 2026-10-19 11:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0009_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Создан')),
+                ('method', models.CharField(max_length=10, verbose_name='Метод')),
+                ('path', models.CharField(max_length=255, verbose_name='Путь')),
+                ('view_name', models.CharField(db_index=True, max_length=255, verbose_name='Маршрут')),
+                ('status_code', models.PositiveSmallIntegerField(verbose_name='Статус')),
+                ('mode', models.CharField(choices=[('cprofile', 'cProfile'), ('sample', 'Сэмплирование стека')], max_length=16, verbose_name='Режим')),
+                ('duration', models.FloatField(verbose_name='Время, с')),
+                ('sql_queries', models.PositiveIntegerField(verbose_name='SQL-запросов')),
+                ('sql_time', models.FloatField(verbose_name='Время SQL, с')),
+                ('serializer_time', models.FloatField(verbose_name='Сериализация, с')),
+                ('summary', models.TextField(verbose_name='Сводка')),
+                ('data', models.BinaryField(verbose_name='Профиль')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Профиль запроса',
+                'verbose_name_plural': 'Профили запросов',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
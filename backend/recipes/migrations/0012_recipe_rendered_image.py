@@ -0,0 +1,18 @@
+# Generated by Django 3.2.24 on 2026-10-19 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_sync_cursor_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='rendered_image',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='Картинка с готовыми копиями'),
+        ),
+    ]
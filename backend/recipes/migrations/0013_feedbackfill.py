@@ -0,0 +1,26 @@
+# Generated by Django 3.2.24 on 2026-10-19 11:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_rendered_avatar'),
+        ('recipes', '0012_recipe_rendered_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedBackfill',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='feed_backfill', serialize=False, to='users.user', verbose_name='Автор')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Дозаполнение лент',
+                'verbose_name_plural': 'Дозаполнение лент',
+            },
+        ),
+    ]
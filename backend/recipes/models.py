@@ -1,7 +1,10 @@
 import secrets
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.utils import timezone
 
 from backend.settings import (
     MAX_LENGTH_INGREDIENT_NAME,
@@ -56,6 +59,12 @@ class Recipe(models.Model):
     image = models.ImageField(
         upload_to='recipes/images',
         verbose_name='Картинка')
+    rendered_image = models.CharField(
+        max_length=100,
+        blank=True,
+        editable=False,
+        verbose_name='Картинка с готовыми копиями',
+    )
     text = models.TextField(verbose_name='Описание')
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name='Время приготовления (в минутах)',
@@ -63,11 +72,38 @@ class Recipe(models.Model):
             MinValueValidator(MIN_COOKING_TIME),
         ],
     )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Изменён',
+    )
 
     class Meta:
         ordering = ['-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            GinIndex(
+                fields=('search_vector',),
+                name='recipe_search_vector_idx',
+            ),
+            models.Index(
+                fields=('cooking_time',),
+                name='recipe_cooking_time_idx',
+            ),
+            models.Index(
+                fields=('author', '-id'),
+                name='recipe_author_id_idx',
+            ),
+            models.Index(
+                fields=('updated_at', 'id'),
+                name='recipe_updated_id_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -102,6 +138,12 @@ class RecipeIngredient(models.Model):
                 name='unique_recipe_ingredient'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=('ingredients', 'recipe'),
+                name='ingredient_recipe_idx',
+            ),
+        ]
 
 
 class Favorite(models.Model):
@@ -117,6 +159,13 @@ class Favorite(models.Model):
         related_name='favorite',
         verbose_name='Рецепт',
     )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        null=True,
+        editable=False,
+        db_index=True,
+        verbose_name='Добавлено',
+    )
 
     class Meta:
         verbose_name = 'Избранное'
@@ -142,6 +191,13 @@ class ShoppingCart(models.Model):
         related_name='shopping_cart',
         verbose_name='Рецепт',
     )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        null=True,
+        editable=False,
+        db_index=True,
+        verbose_name='Добавлено',
+    )
 
     class Meta:
         verbose_name = 'Покупка'
@@ -169,3 +225,285 @@ class ShortLink(models.Model):
         key = secrets.token_urlsafe(MAX_LENGTH_SHORT_LINK_KEY)[
             :MAX_LENGTH_SHORT_LINK_KEY]
         return cls.objects.create(key=key, original_url=url)
+
+
+class ImageJob(models.Model):
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (DONE, 'Выполнено'),
+        (FAILED, 'Ошибка'),
+    )
+
+    model_label = models.CharField(
+        max_length=64, verbose_name='Модель')
+    object_id = models.PositiveBigIntegerField(verbose_name='ID объекта')
+    field_name = models.CharField(max_length=64, verbose_name='Поле')
+    image_name = models.CharField(
+        max_length=255, verbose_name='Исходный файл')
+    status = models.CharField(
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        verbose_name='Статус',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0, verbose_name='Попытки')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Обработка изображения'
+        verbose_name_plural = 'Обработка изображений'
+        indexes = [
+            models.Index(fields=('status', 'id'), name='image_job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.model_label}#{self.object_id} {self.image_name}'
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Владелец ленты',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта',
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_user_recipe',
+            ),
+        ]
+        # Уникальный индекс (user, recipe) читается в обратном порядке
+        # и обслуживает страницы ленты.
+        indexes = [
+            models.Index(
+                fields=('user', 'author'),
+                name='feed_user_author_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.recipe_id}'
+
+
+class FeedBackfill(models.Model):
+    # Автор, опустившийся до порога рассылки. Пока его рецепты не
+    # дописаны в ленты командой rebuild_feeds --pending, они по-прежнему
+    # подмешиваются при чтении.
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='feed_backfill',
+        verbose_name='Автор',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Дозаполнение лент'
+        verbose_name_plural = 'Дозаполнение лент'
+
+    def __str__(self):
+        return str(self.author)
+
+
+class RecipeSimilarity(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similarities',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_recipe_similar',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('recipe', '-score'),
+                name='recipe_similarity_score_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} -> {self.similar_id}'
+
+
+class UserRecommendation(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+        verbose_name='Пользователь',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт',
+    )
+    score = models.FloatField(verbose_name='Оценка')
+
+    class Meta:
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_user_recommendation',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-score'),
+                name='user_recommendation_score_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.recipe_id}'
+
+
+class TrendingScore(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Рецепт',
+    )
+    score = models.FloatField(verbose_name='Популярность')
+
+    class Meta:
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+        indexes = [
+            models.Index(fields=('-score',), name='trending_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.score:.2f}'
+
+
+class TrendingRun(models.Model):
+    computed_at = models.DateTimeField(verbose_name='Пересчитано')
+
+    class Meta:
+        verbose_name = 'Пересчёт популярности'
+        verbose_name_plural = 'Пересчёты популярности'
+
+    def __str__(self):
+        return str(self.computed_at)
+
+
+class Tombstone(models.Model):
+    RECIPE = 'recipe'
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    KIND_CHOICES = (
+        (RECIPE, 'Рецепт'),
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Список покупок'),
+    )
+
+    kind = models.CharField(
+        max_length=16, choices=KIND_CHOICES, verbose_name='Тип')
+    object_id = models.PositiveBigIntegerField(verbose_name='ID рецепта')
+    # Не внешний ключ: записи создаются и при каскадном удалении
+    # пользователя, а устаревшие удаляет prune_tombstones.
+    user_id = models.BigIntegerField(
+        null=True, blank=True, verbose_name='ID пользователя')
+    deleted_at = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        verbose_name='Удалён',
+    )
+
+    class Meta:
+        verbose_name = 'Удалённый объект'
+        verbose_name_plural = 'Удалённые объекты'
+        indexes = [
+            models.Index(
+                fields=('user_id', 'deleted_at'),
+                name='tombstone_user_deleted_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.kind}#{self.object_id}'
+
+
+class RequestProfile(models.Model):
+    CPROFILE = 'cprofile'
+    SAMPLE = 'sample'
+    MODE_CHOICES = (
+        (CPROFILE, 'cProfile'),
+        (SAMPLE, 'Сэмплирование стека'),
+    )
+
+    created_at = models.DateTimeField(
+        auto_now_add=True, db_index=True, verbose_name='Создан')
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Пользователь',
+    )
+    method = models.CharField(max_length=10, verbose_name='Метод')
+    path = models.CharField(max_length=255, verbose_name='Путь')
+    view_name = models.CharField(
+        max_length=255, db_index=True, verbose_name='Маршрут')
+    status_code = models.PositiveSmallIntegerField(verbose_name='Статус')
+    mode = models.CharField(
+        max_length=16, choices=MODE_CHOICES, verbose_name='Режим')
+    duration = models.FloatField(verbose_name='Время, с')
+    sql_queries = models.PositiveIntegerField(verbose_name='SQL-запросов')
+    sql_time = models.FloatField(verbose_name='Время SQL, с')
+    serializer_time = models.FloatField(verbose_name='Сериализация, с')
+    summary = models.TextField(verbose_name='Сводка')
+    data = models.BinaryField(verbose_name='Профиль')
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.duration:.3f} с)'
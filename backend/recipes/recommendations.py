@@ -0,0 +1,118 @@
+from itertools import chain, islice
+
+from django.db import transaction
+
+from backend.settings import RECOMMENDATION_BATCH_SIZE, RECOMMENDATION_TOP_K
+from .models import Favorite, RecipeSimilarity, UserRecommendation
+
+
+def _favorites_matrix():
+    # numpy и scipy нужны только этому пакетному заданию, поэтому
+    # импортируются лениво и не грузятся в веб-воркеры.
+    import numpy as np
+    from scipy import sparse
+
+    pairs = np.fromiter(
+        chain.from_iterable(
+            Favorite.objects.values_list('user_id', 'recipe_id')
+            .iterator(chunk_size=RECOMMENDATION_BATCH_SIZE)
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    user_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    recipe_ids, columns = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float32), (rows, columns)),
+        shape=(len(user_ids), len(recipe_ids)),
+    )
+    return matrix, user_ids, recipe_ids
+
+
+def _top_k(matrix, top_k):
+    # Для каждой строки разреженной матрицы отдаёт k наибольших значений
+    # в порядке убывания.
+    import numpy as np
+
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        values = matrix.data[start:end]
+        columns = matrix.indices[start:end]
+        if len(values) > top_k:
+            best = np.argpartition(-values, top_k)[:top_k]
+            values, columns = values[best], columns[best]
+        order = np.argsort(-values, kind='stable')
+        yield row, columns[order], values[order]
+
+
+def compute_similarity(matrix, top_k):
+    # Косинусная мера между рецептами: число пользователей, добавивших в
+    # избранное оба рецепта, нормированное на популярность каждого.
+    import numpy as np
+    from scipy import sparse
+
+    cooccurrence = (matrix.T @ matrix).tocsr()
+    cooccurrence.setdiag(0)
+    cooccurrence.eliminate_zeros()
+    counts = np.sqrt(np.asarray(matrix.sum(axis=0)).ravel())
+    norms = sparse.diags(np.divide(
+        1, counts, out=np.zeros_like(counts), where=counts > 0))
+    similarity = (norms @ cooccurrence @ norms).tocsr()
+
+    rows, columns, values = [], [], []
+    for row, row_columns, row_values in _top_k(similarity, top_k):
+        rows.append(np.full(len(row_columns), row))
+        columns.append(row_columns)
+        values.append(row_values)
+    if not rows:
+        return sparse.csr_matrix(similarity.shape, dtype=np.float32)
+    return sparse.csr_matrix(
+        (np.concatenate(values),
+         (np.concatenate(rows), np.concatenate(columns))),
+        shape=similarity.shape,
+    )
+
+
+def compute_user_scores(matrix, similarity):
+    # Оценка рецепта для пользователя — сумма сходства с рецептами из его
+    # избранного. Уже добавленные рецепты исключаются.
+    scores = (matrix @ similarity).tocsr()
+    scores = (scores - scores.multiply(matrix)).tocsr()
+    scores.eliminate_zeros()
+    return scores
+
+
+def _save(model, objects):
+    objects = iter(objects)
+    total = 0
+    while batch := list(islice(objects, RECOMMENDATION_BATCH_SIZE)):
+        model.objects.bulk_create(batch)
+        total += len(batch)
+    return total
+
+
+def compute_recommendations(top_k=RECOMMENDATION_TOP_K):
+    matrix, user_ids, recipe_ids = _favorites_matrix()
+    similarity = compute_similarity(matrix, top_k)
+    scores = compute_user_scores(matrix, similarity)
+    with transaction.atomic():
+        RecipeSimilarity.objects.all().delete()
+        UserRecommendation.objects.all().delete()
+        similar_total = _save(RecipeSimilarity, (
+            RecipeSimilarity(
+                recipe_id=recipe_ids[row],
+                similar_id=recipe_ids[column],
+                score=float(score),
+            )
+            for row, columns, values in _top_k(similarity, top_k)
+            for column, score in zip(columns, values)
+        ))
+        recommended_total = _save(UserRecommendation, (
+            UserRecommendation(
+                user_id=user_ids[row],
+                recipe_id=recipe_ids[column],
+                score=float(score),
+            )
+            for row, columns, values in _top_k(scores, top_k)
+            for column, score in zip(columns, values)
+        ))
+    return similar_total, recommended_total
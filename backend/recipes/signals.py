@@ -0,0 +1,110 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_ingredient_catalogue, invalidate_recipes
+from .feed import (
+    backfill_feed,
+    change_subscribers_count,
+    fan_out_recipe,
+    remove_from_feed
+)
+from .jobs import enqueue_image_job
+from .models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tombstone
+)
+from .sync import add_tombstone, touch_recipes
+from users.models import Subscription, User
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    invalidate_recipes([instance.pk])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_recipe_ingredient(sender, instance, **kwargs):
+    invalidate_recipes([instance.recipe_id])
+    touch_recipes([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_ingredient_recipes(sender, instance, created, **kwargs):
+    if created:
+        return
+    recipe_ids = list(
+        RecipeIngredient.objects.filter(ingredients=instance)
+        .values_list('recipe_id', flat=True)
+    )
+    invalidate_recipes(recipe_ids)
+    touch_recipes(recipe_ids)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients(sender, **kwargs):
+    invalidate_ingredient_catalogue()
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(sender, instance, created, update_fields,
+                              **kwargs):
+    if created or update_fields == frozenset(('last_login',)):
+        return
+    recipe_ids = list(instance.recipes.values_list('pk', flat=True))
+    invalidate_recipes(recipe_ids)
+    touch_recipes(recipe_ids)
+
+
+@receiver(post_save, sender=Recipe)
+def enqueue_recipe_image(sender, instance, **kwargs):
+    enqueue_image_job(instance, 'image')
+
+
+@receiver(post_save, sender=User)
+def enqueue_avatar(sender, instance, update_fields, **kwargs):
+    if update_fields == frozenset(('last_login',)):
+        return
+    enqueue_image_job(instance, 'avatar')
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_new_recipe(sender, instance, created, **kwargs):
+    if created:
+        fan_out_recipe(instance)
+
+
+@receiver(post_save, sender=Subscription)
+def add_subscription_to_feed(sender, instance, created, **kwargs):
+    if not created:
+        return
+    change_subscribers_count(instance.author_id, 1)
+    backfill_feed(instance.subscriber_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def remove_subscription_from_feed(sender, instance, **kwargs):
+    change_subscribers_count(instance.author_id, -1)
+    remove_from_feed(instance.subscriber_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def add_recipe_tombstone(sender, instance, **kwargs):
+    add_tombstone(Tombstone.RECIPE, instance.pk)
+
+
+@receiver(post_delete, sender=Favorite)
+def add_favorite_tombstone(sender, instance, **kwargs):
+    add_tombstone(Tombstone.FAVORITE, instance.recipe_id, instance.user_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def add_shopping_cart_tombstone(sender, instance, **kwargs):
+    add_tombstone(
+        Tombstone.SHOPPING_CART, instance.recipe_id, instance.user_id)
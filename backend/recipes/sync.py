@@ -0,0 +1,122 @@
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from backend.settings import (
+    SYNC_CURSOR_MARGIN,
+    SYNC_PAGE_SIZE,
+    SYNC_TOMBSTONE_TTL
+)
+from .models import Favorite, Recipe, ShoppingCart, Tombstone
+
+# Курсор — отметка времени, после которой всё уже отдано, или отметка и id
+# последнего отданного рецепта, если страница закончилась внутри отметки.
+CURSOR_SEPARATOR = '_'
+
+COLLECTIONS = (
+    ('favorites', Favorite, Tombstone.FAVORITE),
+    ('shopping_cart', ShoppingCart, Tombstone.SHOPPING_CART),
+)
+
+
+def touch_recipes(recipe_ids):
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        updated_at=timezone.now())
+
+
+def add_tombstone(kind, object_id, user_id=None):
+    Tombstone.objects.create(kind=kind, object_id=object_id, user_id=user_id)
+
+
+def prune_tombstones():
+    deleted, _ = Tombstone.objects.filter(
+        deleted_at__lt=timezone.now() - timedelta(seconds=SYNC_TOMBSTONE_TTL)
+    ).delete()
+    return deleted
+
+
+def is_cursor_expired(since):
+    return since < timezone.now() - timedelta(seconds=SYNC_TOMBSTONE_TTL)
+
+
+def parse_cursor(cursor):
+    value, _, pk = cursor.partition(CURSOR_SEPARATOR)
+    since = parse_datetime(value)
+    if since is None or (pk and not pk.isdigit()):
+        raise ValueError(cursor)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since, timezone.utc)
+    return since, int(pk) if pk else None
+
+
+def format_cursor(since, pk=None):
+    value = since.isoformat().replace('+00:00', 'Z')
+    return value if pk is None else f'{value}{CURSOR_SEPARATOR}{pk}'
+
+
+def _in_window(field, since, until):
+    window = Q(**{f'{field}__lte': until})
+    if since is not None:
+        window &= Q(**{f'{field}__gt': since})
+    return window
+
+
+def get_sync_page(since, since_id=None):
+    # Страница ограничена SYNC_PAGE_SIZE рецептами по ключу
+    # (updated_at, id), поэтому много рецептов с одной отметкой (после
+    # миграции или правки автора) делятся между страницами.
+    until = timezone.now() - timedelta(seconds=SYNC_CURSOR_MARGIN)
+    window = Q(updated_at__lte=until)
+    if since is not None:
+        after = Q(updated_at__gt=since)
+        if since_id is not None:
+            after |= Q(updated_at=since, id__gt=since_id)
+        window &= after
+    page = list(Recipe.objects.filter(window).order_by(
+        'updated_at', 'id'
+    ).values_list('updated_at', 'id')[:SYNC_PAGE_SIZE + 1])
+    if len(page) > SYNC_PAGE_SIZE:
+        last_updated_at, last_id = page[SYNC_PAGE_SIZE - 1]
+        return (
+            [pk for _, pk in page[:SYNC_PAGE_SIZE]],
+            last_updated_at,
+            format_cursor(last_updated_at, last_id),
+            True,
+        )
+    return [pk for _, pk in page], until, format_cursor(until), False
+
+
+def get_deleted_recipe_ids(since, until):
+    if since is None:
+        return []
+    return list(Tombstone.objects.filter(
+        _in_window('deleted_at', since, until), kind=Tombstone.RECIPE
+    ).values_list('object_id', flat=True).distinct())
+
+
+def get_collection_changes(user, since, until):
+    changes = {}
+    for name, model, kind in COLLECTIONS:
+        window = _in_window('created_at', since, until)
+        if since is None:
+            # Записи, добавленные до появления created_at.
+            window |= Q(created_at__isnull=True)
+        added = list(model.objects.filter(window, user=user).order_by(
+            'recipe_id').values_list('recipe_id', flat=True))
+        deleted = []
+        if since is not None:
+            tombstoned = set(Tombstone.objects.filter(
+                _in_window('deleted_at', since, until),
+                user_id=user.pk,
+                kind=kind,
+            ).values_list('object_id', flat=True))
+            # Проверяются только рецепты с отметкой об удалении, а не всё
+            # избранное пользователя.
+            if tombstoned:
+                deleted = sorted(tombstoned - set(model.objects.filter(
+                    user=user, recipe_id__in=tombstoned
+                ).values_list('recipe_id', flat=True)))
+        changes[name] = {'added': added, 'deleted': deleted}
+    return changes
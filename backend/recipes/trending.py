@@ -0,0 +1,77 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from backend.settings import (
+    TRENDING_BATCH_SIZE,
+    TRENDING_CUTOFF_MARGIN,
+    TRENDING_HALF_LIFE,
+    TRENDING_MIN_SCORE,
+    TRENDING_REBUILD_WINDOW,
+    TRENDING_WEIGHTS
+)
+from .models import Favorite, ShoppingCart, TrendingRun, TrendingScore
+
+EVENT_MODELS = {'favorite': Favorite, 'shopping_cart': ShoppingCart}
+
+
+def decay(seconds):
+    return 0.5 ** (seconds / TRENDING_HALF_LIFE)
+
+
+def get_event_scores(since, until):
+    scores = defaultdict(float)
+    for name, model in EVENT_MODELS.items():
+        events = model.objects.filter(
+            created_at__gt=since, created_at__lte=until
+        ).values_list('recipe_id', 'created_at')
+        for recipe_id, created_at in events.iterator(
+                chunk_size=TRENDING_BATCH_SIZE):
+            scores[recipe_id] += TRENDING_WEIGHTS[name] * decay(
+                (until - created_at).total_seconds())
+    return scores
+
+
+def update_trending(rebuild=False, now=None):
+    # Между запусками все счётчики умножаются на общий коэффициент
+    # затухания, а новые события добавляются с весом по их возрасту,
+    # поэтому каждый запуск читает только события с прошлого пересчёта.
+    # Пересчёт идёт на момент cutoff чуть раньше now, и он же становится
+    # началом следующего окна.
+    cutoff = (now or timezone.now()) - timedelta(
+        seconds=TRENDING_CUTOFF_MARGIN)
+    with transaction.atomic():
+        run = TrendingRun.objects.select_for_update().first()
+        if rebuild or run is None:
+            TrendingScore.objects.all().delete()
+            since = cutoff - timedelta(seconds=TRENDING_REBUILD_WINDOW)
+        else:
+            since = run.computed_at
+            TrendingScore.objects.update(
+                score=F('score') * decay((cutoff - since).total_seconds()))
+
+        scores = get_event_scores(since, cutoff)
+        existing = TrendingScore.objects.in_bulk(list(scores))
+        for recipe_id, trending in existing.items():
+            trending.score += scores[recipe_id]
+        TrendingScore.objects.bulk_update(
+            existing.values(), ('score',), batch_size=TRENDING_BATCH_SIZE)
+        TrendingScore.objects.bulk_create(
+            (
+                TrendingScore(recipe_id=recipe_id, score=score)
+                for recipe_id, score in scores.items()
+                if recipe_id not in existing
+            ),
+            batch_size=TRENDING_BATCH_SIZE,
+        )
+        TrendingScore.objects.filter(score__lt=TRENDING_MIN_SCORE).delete()
+
+        if run is None:
+            TrendingRun.objects.create(computed_at=cutoff)
+        else:
+            run.computed_at = cutoff
+            run.save(update_fields=('computed_at',))
+    return len(scores)
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.24 on 2026-10-19 10:55
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subscribers(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Subscription = apps.get_model('users', 'Subscription')
+    subscribers = Subscription.objects.filter(
+        author=OuterRef('pk')
+    ).order_by().values('author').annotate(total=Count('*')).values('total')
+    User.objects.update(subscribers_count=Coalesce(Subquery(subscribers), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Подписчиков'),
+        ),
+        migrations.RunPython(count_subscribers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.24 on 2026-10-19 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_subscribers_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='rendered_avatar',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='Аватарка с готовыми копиями'),
+        ),
+    ]
@@ -46,6 +46,17 @@ class User(AbstractUser):
         upload_to='users',
         verbose_name='Аватарка',
     )
+    rendered_avatar = models.CharField(
+        max_length=100,
+        blank=True,
+        editable=False,
+        verbose_name='Аватарка с готовыми копиями',
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков',
+    )
 
     class Meta:
         verbose_name = 'Пользователь'